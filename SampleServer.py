@@ -30,20 +30,12 @@ logging.basicConfig(filename='test.log', encoding='utf-8', level=logging.DEBUG)
 server = pyBGBLink.Server('127.0.0.1',12800)
 
 async def send_button_forever(server):
-    #instantiate the packets
-    DownPacket = pyBGBLink.JoypadPacket()
-    UpPacket = pyBGBLink.JoypadPacket()
-
-    #set the packet flags appropriately
-    DownPacket.button = DownPacket.defines.B_DOWN
-    UpPacket.button = UpPacket.defines.B_DOWN
-    DownPacket.isPressed = True
+    #track the joypad state so only real changes are sent
+    joypad = pyBGBLink.JoypadState(server)
 
     while True:
         await asyncio.sleep(1)
-        server.send_packet(DownPacket.assemble())
-        await asyncio.sleep(0.025)
-        server.send_packet(UpPacket.assemble())
+        await joypad.tap(pyBGBLink.defines.B_DOWN, duration=0.025)
 
 #main program code
 async def main():
@@ -52,7 +44,7 @@ async def main():
         send_button_forever(server))
 
 try:
-    asyncio.run(main())
+    pyBGBLink.run(main())
 except KeyboardInterrupt:
     print('Ctrl-C received, quitting immediately')
     logging.critical('Ctrl-C received, quitting immediately')
@@ -0,0 +1,110 @@
+# benchmarks/bench_bridge.py
+#
+# Compares the relay latency of a proxied pair held in one process with a
+# pair split across two processes joined by a Bridge over a unix socket.
+# Each round trip sends a packet from one emulator and waits for it to
+# arrive at the other.
+#
+#   python benchmarks/bench_bridge.py [round trips]
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pyBGBLink.bridge import open_bridge, start_bridge_server
+from pyBGBLink.peers import ProxyPeer
+
+SYNC2 = bytes((0x69, 0x12, 0x80, 0, 0, 0, 0, 0))
+CHANNEL = 7
+
+async def serve_peers(on_peer):
+    async def on_connected(reader, writer):
+        peer = ProxyPeer(reader, writer, 0)
+        rtask = asyncio.create_task(peer._read_loop())
+        wtask = asyncio.create_task(peer._write_loop())
+        await on_peer(peer)
+        await rtask
+        wtask.cancel()
+    server = await asyncio.start_server(on_connected, '127.0.0.1', 0)
+    return server.sockets[0].getsockname()[1]
+
+async def measure(ports, count):
+    ((readerA, writerA), (readerB, writerB)) = [await asyncio.open_connection('127.0.0.1', port) for port in ports]
+    # let the version and status packets settle, then discard them
+    await asyncio.sleep(0.3)
+    for reader in (readerA, readerB):
+        try:
+            while True:
+                await asyncio.wait_for(reader.readexactly(8), 0.1)
+        except asyncio.TimeoutError:
+            pass
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        writerA.write(SYNC2)
+        await readerB.readexactly(8)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(count * 0.99)]
+
+async def in_process(count):
+    peers = []
+    async def on_peer(peer):
+        peers.append(peer)
+        if len(peers) == 2:
+            await peers[0].connect(peers[1])
+            await peers[1].connect(peers[0])
+    port = await serve_peers(on_peer)
+    return await measure((port, port), count)
+
+def bridged_side(path, listen, ports):
+    logging.disable(logging.CRITICAL)
+    async def main():
+        bridge = asyncio.get_running_loop().create_future()
+        async def on_peer(peer):
+            await (await bridge).attach(peer, CHANNEL)
+        ports.put(await serve_peers(on_peer))
+        if listen:
+            async def on_bridge(connected):
+                bridge.set_result(connected)
+            await start_bridge_server(on_bridge, path)
+        else:
+            # the socket file appears just before the other process starts listening on it
+            while not bridge.done():
+                try:
+                    bridge.set_result(await open_bridge(path))
+                except (FileNotFoundError, ConnectionRefusedError):
+                    await asyncio.sleep(0.01)
+        await asyncio.sleep(3600)
+    asyncio.run(main())
+
+def bridged(count):
+    path = os.path.join(tempfile.mkdtemp(), 'bridge.sock')
+    ports = multiprocessing.Queue()
+    sides = []
+    for listen in (True, False):
+        process = multiprocessing.Process(target=bridged_side, args=(path, listen, ports), daemon=True)
+        process.start()
+        sides.append(process)
+    try:
+        return asyncio.run(measure((ports.get(), ports.get()), count))
+    finally:
+        for process in sides:
+            process.kill()
+        os.unlink(path)
+
+def main():
+    logging.disable(logging.CRITICAL)
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    for (mode, result) in (('in-process', asyncio.run(in_process(count))), ('bridged', bridged(count))):
+        print('%-12s median %8.1fus  p99 %8.1fus' % (mode, result[0] * 1e6, result[1] * 1e6))
+
+if __name__ == '__main__':
+    main()
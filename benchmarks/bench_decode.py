@@ -0,0 +1,48 @@
+# benchmarks/bench_decode.py
+#
+# Pushes random 8-byte packets through BGBProtocol._on_packet_received and
+# reports how many are validated per second: all-random traffic (almost all
+# unknown commands, dropped at the lookup table) and traffic where every
+# packet has a valid command and is decoded.
+#
+#   python benchmarks/bench_decode.py [packets]
+
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pyBGBLink.protocol import BGBProtocol
+
+# version packets are left out, a wrong version is a deliberate disconnect
+VALID = (0x65, 0x68, 0x69, 0x6A, 0x6C, 0x6D)
+
+class Discard(BGBProtocol):
+    active = True
+
+def packets(count, valid, seed = 0):
+    rng = random.Random(seed)
+    data = bytearray(rng.randbytes(count * 8))
+    if valid:
+        for offset in range(0, len(data), 8):
+            data[offset] = rng.choice(VALID)
+    return memoryview(bytes(data))
+
+def main():
+    logging.disable(logging.CRITICAL)
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    for (name, valid, n) in (('random', False, count), ('valid', True, count // 20)):
+        protocol = Discard()
+        buffer = packets(n, valid)
+        received = protocol._on_packet_received
+        start = time.perf_counter()
+        for offset in range(0, n * 8, 8):
+            received(buffer[offset:offset + 8])
+        elapsed = time.perf_counter() - start
+        print('%-7s %8d packets %7.3fs %10.0f packets/s %8d errors' % (name, n, elapsed, n / elapsed, sum(protocol.errors.values())))
+
+if __name__ == '__main__':
+    main()
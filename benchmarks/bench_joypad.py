@@ -0,0 +1,68 @@
+# benchmarks/bench_joypad.py
+#
+# Compares naive per-event joypad sending with JoypadState on a recorded-style
+# input trace: the held button mask sampled once per frame, where most frames
+# don't change anything.
+#
+#   python benchmarks/bench_joypad.py [frames]
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from uint import Int as FixedInt
+
+import pyBGBLink
+
+class Counter:
+    def __init__(self):
+        self.sent = 0
+
+    def send_packet(self, raw_packet):
+        self.sent += 1
+
+def make_trace(frames, seed = 1):
+    rng = random.Random(seed)
+    trace = []
+    mask = 0
+    for _ in range(frames):
+        if rng.random() < 0.1:
+            mask ^= 1 << rng.randrange(8)
+        trace.append(mask)
+    return trace
+
+def naive(trace):
+    # what a caller without state tracking does: report every held button each frame, and a release for each button let go
+    sink = Counter()
+    previous = 0
+    for mask in trace:
+        for button in range(8):
+            bit = 1 << button
+            if mask & bit or previous & bit:
+                packet = pyBGBLink.JoypadPacket()
+                packet.button = FixedInt(button, 8)
+                packet.isPressed = bool(mask & bit)
+                sink.send_packet(packet.assemble())
+        previous = mask
+    return sink.sent
+
+def tracked(trace):
+    sink = Counter()
+    joypad = pyBGBLink.JoypadState(sink)
+    for mask in trace:
+        joypad.set_state(mask)
+    return sink.sent
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    trace = make_trace(frames)
+    for (name, func) in (('naive', naive), ('JoypadState', tracked)):
+        start = time.process_time()
+        sent = func(trace)
+        print('%-12s %9d packets %8.3fs CPU' % (name, sent, time.process_time() - start))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# benchmarks/bench_loops.py
+#
+# Compares relay and broadcast throughput under each event loop
+# implementation over real TCP sockets. Relay pushes packets from one
+# emulator through a proxied pair to the other, broadcast sends packets
+# from the server to every connected client. uvloop is skipped when it is
+# not installed.
+#
+#   python benchmarks/bench_loops.py [packets] [clients]
+
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pyBGBLink
+from pyBGBLink import eventloop
+from pyBGBLink.server import ProxyServer
+
+SYNC2 = bytes((0x69, 0x12, 0x80, 0, 0, 0, 0, 0))
+
+async def discard_pending(reader, duration = 0.1):
+    # peers keep sending their own packets, so read for a fixed time instead of until quiet
+    deadline = asyncio.get_running_loop().time() + duration
+    try:
+        while True:
+            await asyncio.wait_for(reader.read(65536), deadline - asyncio.get_running_loop().time())
+    except asyncio.TimeoutError:
+        pass
+
+async def read_packets(reader, count):
+    received = 0
+    while received < count * 8:
+        data = await reader.read(65536)
+        if not data:
+            break
+        received += len(data)
+    return received // 8
+
+async def relay(count, clients):
+    server = ProxyServer('127.0.0.1', 0)
+    listener = await asyncio.start_server(server._on_client_connected, '127.0.0.1', 0)
+    port = listener.sockets[0].getsockname()[1]
+    ((readerA, writerA), (readerB, writerB)) = [await asyncio.open_connection('127.0.0.1', port) for _ in range(2)]
+    while len(server.peers) < 2:
+        await asyncio.sleep(0.01)
+    (peerA, peerB) = server.peers.values()
+    await peerA.connect(peerB)
+    await peerB.connect(peerA)
+    await asyncio.sleep(0.2)
+    await discard_pending(readerB)
+    start = time.perf_counter()
+    writerA.write(SYNC2 * count)
+    received = await read_packets(readerB, count)
+    elapsed = time.perf_counter() - start
+    listener.close()
+    return received, elapsed
+
+async def broadcast(count, clients):
+    server = pyBGBLink.Server('127.0.0.1', 0)
+    listener = await asyncio.start_server(server._on_client_connected, '127.0.0.1', 0)
+    port = listener.sockets[0].getsockname()[1]
+    connections = [await asyncio.open_connection('127.0.0.1', port) for _ in range(clients)]
+    readers = [reader for (reader, writer) in connections]
+    while len(server.peers) < clients:
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.2)
+    for reader in readers:
+        await discard_pending(reader)
+    start = time.perf_counter()
+    reading = [asyncio.create_task(read_packets(reader, count)) for reader in readers]
+    for _ in range(count):
+        server.send_packet(SYNC2)
+    received = sum(await asyncio.gather(*reading))
+    elapsed = time.perf_counter() - start
+    listener.close()
+    return received, elapsed
+
+def main():
+    logging.disable(logging.CRITICAL)
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    for loop in ('asyncio', 'uvloop'):
+        if loop == 'uvloop' and eventloop.uvloop is None:
+            print('%-8s skipped, uvloop is not installed' % loop)
+            continue
+        for (name, bench) in (('relay', relay), ('broadcast', broadcast)):
+            (received, elapsed) = pyBGBLink.run(bench(count, clients), loop)
+            print('%-8s %-10s %9d packets %8.3fs %10.0f packets/s' % (loop, name, received, elapsed, received / elapsed))
+
+if __name__ == '__main__':
+    main()
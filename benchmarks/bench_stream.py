@@ -0,0 +1,60 @@
+# benchmarks/bench_stream.py
+#
+# Compares consuming joypad packets through an _on_joypad handler with
+# consuming them in batches from Peer.packets(). Runs on the simulation
+# loop so only CPU time is measured.
+#
+#   python benchmarks/bench_stream.py [packets]
+
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pyBGBLink
+from pyBGBLink.peers import Peer
+from pyBGBLink.simulation import SimulatedNetwork, run
+
+JOYPAD = bytes((0x65, 0x03, 0, 0, 0, 0, 0, 0))
+
+class HandlerPeer(Peer):
+    received = 0
+
+    def _on_joypad(self, packet):
+        super()._on_joypad(packet)
+        self.received += 1
+
+async def consume(mode, count):
+    ((reader, writer), (remoteReader, remoteWriter)) = SimulatedNetwork().link()
+    peer = HandlerPeer(reader, writer, 0)
+    rtask = asyncio.create_task(peer._read_loop())
+    wtask = asyncio.create_task(peer._write_loop())
+    # one write per 512 packets, the size of a full read
+    chunk = JOYPAD * 512
+    for _ in range(count // 512):
+        remoteWriter.write(chunk)
+    remoteWriter.close()
+    start = time.process_time()
+    if mode == 'handlers':
+        await rtask
+        received = peer.received
+    else:
+        received = 0
+        async for batch in peer.packets(types=[pyBGBLink.defines.C_JOYPAD], max_batch=512, raw=(mode == 'batched raw'), exclusive=True):
+            received += len(batch)
+    elapsed = time.process_time() - start
+    wtask.cancel()
+    return received, elapsed
+
+def main():
+    logging.disable(logging.CRITICAL)
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200 * 512
+    for mode in ('handlers', 'batched', 'batched raw'):
+        (received, elapsed) = run(consume(mode, count))
+        print('%-12s %8d packets %8.3fs CPU %10.0f packets/s' % (mode, received, elapsed, received / elapsed))
+
+if __name__ == '__main__':
+    main()
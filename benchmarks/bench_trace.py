@@ -0,0 +1,56 @@
+# benchmarks/bench_trace.py
+#
+# Measures the overhead of the packet tracer on the read path, with tracing
+# off, on, and sampling one packet in 16. Packets are consumed both through
+# the _on_joypad handlers and through an exclusive raw stream, where the
+# read loop itself is most of the work. Runs on the simulation loop so only
+# CPU time is measured, best of three runs.
+#
+#   python benchmarks/bench_trace.py [packets]
+
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pyBGBLink
+from pyBGBLink.peers import Peer
+from pyBGBLink.simulation import SimulatedNetwork, run
+from pyBGBLink.trace import tracer
+
+JOYPAD = bytes((0x65, 0x03, 0, 0, 0, 0, 0, 0))
+
+async def consume(consumer, count):
+    ((reader, writer), (remoteReader, remoteWriter)) = SimulatedNetwork().link()
+    peer = Peer(reader, writer, 0)
+    rtask = asyncio.create_task(peer._read_loop())
+    # one write per 512 packets, the size of a full read
+    chunk = JOYPAD * 512
+    for _ in range(count // 512):
+        remoteWriter.write(chunk)
+    remoteWriter.close()
+    start = time.process_time()
+    if consumer == 'handlers':
+        await rtask
+    else:
+        async for batch in peer.packets(types=[pyBGBLink.defines.C_JOYPAD], max_batch=512, raw=True, exclusive=True):
+            pass
+    return time.process_time() - start
+
+def main():
+    logging.disable(logging.CRITICAL)
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200 * 512
+    for consumer in ('handlers', 'raw stream'):
+        baseline = None
+        for (mode, enabled, sampleEvery) in (('off', False, 1), ('on', True, 1), ('sampled 1/16', True, 16)):
+            tracer.enabled = enabled
+            tracer.sampleEvery = sampleEvery
+            elapsed = min(run(consume(consumer, count)) for _ in range(3))
+            baseline = baseline or elapsed
+            print('%-10s %-12s %8.3fs CPU %10.0f packets/s %+6.1f%%' % (consumer, mode, elapsed, count / elapsed, (elapsed / baseline - 1) * 100))
+
+if __name__ == '__main__':
+    main()
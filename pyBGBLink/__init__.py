@@ -16,4 +16,8 @@
 
 from .server import Server
 from .client import Client
-from .protocol import VersionPacket, JoypadPacket, Sync1Packet, Sync2Packet, Sync3Packet, StatusPacket, WantDisconnectPacket
\ No newline at end of file
+from .protocol import defines, VersionPacket, JoypadPacket, Sync1Packet, Sync2Packet, Sync3Packet, StatusPacket, WantDisconnectPacket
+from .trace import PacketTracer, tracer
+from .bridge import Bridge, RemotePeer, open_bridge, start_bridge_server
+from .eventloop import run, loop_factory, loop_name
+from .joypad import JoypadState, button_mask, set_states
\ No newline at end of file
@@ -0,0 +1,362 @@
+# pyBGBLink/bridge.py
+#
+#Copyright 2020 @digital-pet
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+import asyncio
+import logging
+from collections import deque
+from struct import pack, unpack
+
+from uint import Int as FixedInt
+
+from .protocol import defines
+
+# frame header: channel number, packet count. A count of zero closes the channel and a count of
+# STATE carries the state of the peer on the sending side instead of packets. A close is answered
+# with a close, so both sides know when a channel number is free to be reused.
+HEADER = '=IH'
+HEADER_SIZE = 6
+STATE = 0xFFFF
+MAX_FRAME_PACKETS = 0xFFFE
+# peer state: backlog in packets, last sync round trip, age of that round trip and how long the last
+# sync has been waiting for its reply, all in microseconds. NO_SAMPLE marks an age that isn't known.
+STATE_FORMAT = '=IIII'
+STATE_SIZE = 16
+NO_SAMPLE = 0xFFFFFFFF
+C_STATUS = int(defines.C_STATUS)
+
+def _us(seconds):
+    return min(int(seconds * 1000000), NO_SAMPLE - 1)
+
+class RemotePeer:
+    """RemotePeer: A stand-in for a peer connected to another process.
+
+    Behaves enough like a Peer to be the partner of a local ProxyPeer. Packets sent to it are
+    forwarded over the bridge to the other process, where they are delivered to the ProxyPeer
+    attached to the same channel. The backlog and link latency used for flow control are those of
+    the real peer, as last reported by the other process, plus anything still queued on the bridge
+    for this channel.
+
+    Args:
+        bridge (pyBGBLink.bridge.Bridge): The bridge to the process holding the real peer
+        channel (int): The channel number both processes attached the pair to
+    """
+    def __init__(self, bridge, channel):
+        self.bridge = bridge
+        self.id = channel
+        self.name = bridge.name
+        self.defines = defines
+        self.ownstatus = defines.S_SUPPORT_WANTDISCONNECT
+        self.peerstatus = None
+        self.closed = False
+        self.queued = 0                 # packets for this channel still in the bridge queue
+        self.remoteBacklog = 0
+        self.remoteLatency = 0.0
+        self.remoteLatencyTime = None
+        self.remoteSyncSince = None
+
+    @property
+    def active(self):
+        return self.bridge.active and not self.closed
+
+    def _on_state(self, payload):
+        """_on_state: Records the state of the real peer reported by the other process
+
+        Args:
+            payload (Bytes): A STATE frame payload
+        """
+        (backlog, latency, latencyAge, pendingAge) = unpack(STATE_FORMAT, payload)
+        now = self.bridge.clock()
+        self.remoteBacklog = backlog
+        if latencyAge != NO_SAMPLE:
+            self.remoteLatency = latency / 1000000
+            self.remoteLatencyTime = now - latencyAge / 1000000
+        self.remoteSyncSince = None if pendingAge == NO_SAMPLE else now - pendingAge / 1000000
+
+    def get_backlog(self):
+        """Returns the packets waiting on their way to the remote peer's emulator.
+
+        Returns:
+            int: Packets queued on the bridge for this channel plus the remote peer's reported backlog
+        """
+        return self.queued + self.remoteBacklog
+
+    def get_link_latency(self, since = None):
+        """Returns the remote peer's sync round trip latency, as Peer.get_link_latency.
+
+        Args:
+            since (float, optional): Ignore round trips measured before this clock time. Defaults to None.
+
+        Returns:
+            float: Latency in seconds
+        """
+        if self.remoteLatencyTime is not None and (since is None or self.remoteLatencyTime >= since):
+            return self.remoteLatency
+        return 0.0
+
+    def get_sync_wait(self):
+        """Returns how long the remote peer's last sync has been waiting for its reply, as Peer.get_sync_wait.
+
+        Returns:
+            float: Seconds waited, 0.0 if no sync is waiting
+        """
+        if self.remoteSyncSince is None:
+            return 0.0
+        return self.bridge.clock() - self.remoteSyncSince
+
+    def send_packet(self, raw_packet):
+        """Schedules a packet to be sent to the remote peer.
+
+        Args:
+            raw_packet (Bytes): An assembled BGBLink packet
+        """
+        if self.active:
+            self.queued += 1
+            self.bridge.outQ.put_nowait((self.id, raw_packet))
+
+class Bridge:
+    """Bridge: Relays packets for proxied pairs split across two processes.
+
+    Each pair is identified by a channel number agreed by both processes. Packets queued for the
+    remote side are written in batched frames, one header per run of packets on the same channel.
+    Frames for a channel that isn't attached yet are held until it is, and frames sent by a pair
+    that has already been closed on this side are discarded. Pairs where both peers are local
+    should be connected directly with ProxyPeer.connect instead.
+
+    Args:
+        reader (asyncio.streams.Reader): The reader associated with the bridge connection.
+        writer (asyncio.streams.Writer): The writer associated with the bridge connection.
+    """
+    stateInterval = 0.05    # seconds between reports of each local peer's state
+    maxEarlyPackets = 4096  # packets held for a channel before it is attached
+    maxEarlyChannels = 64   # unattached channels frames are held for
+
+    def __init__(self, reader, writer):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.reader = reader
+        self.writer = writer
+        self.name = writer.get_extra_info('peername')
+        self.clock = asyncio.get_running_loop().time
+        self.active = True
+        self.outQ = asyncio.Queue()
+        self.channels = {}
+        self.early = {}             # channel: [packets held, deque of (count, payload)] before attach
+        self.earlyState = {}        # channel: latest STATE payload received before attach
+        self.closing = {}           # channel: closes sent that the other side hasn't answered yet
+
+    def start(self):
+        """Starts the read and write loops of the bridge.
+
+        Returns:
+            asyncio.Task: The read loop task, which completes when the bridge is closed
+        """
+        self.wtask = asyncio.create_task(self._write_loop())
+        return asyncio.create_task(self._read_loop())
+
+    async def attach(self, peer, channel):
+        """Connects a local ProxyPeer to its partner on the other side of the bridge.
+
+        Args:
+            peer (pyBGBLink.peers.ProxyPeer): A connected and active local peer
+            channel (int): The channel number, the other process must attach its peer with the same number
+
+        Returns:
+            pyBGBLink.bridge.RemotePeer: The stand-in for the remote partner
+        """
+        remote = RemotePeer(self, channel)
+        self.channels[channel] = (peer, remote)
+        # deliver anything the other process sent before this side attached
+        if channel in self.earlyState:
+            remote._on_state(self.earlyState.pop(channel))
+        for (count, payload) in self.early.pop(channel, (0, ()))[1]:
+            self._on_frame(peer, remote, count, payload)
+        await peer.connect(remote)
+        asyncio.create_task(self._watch(peer, remote))
+        return remote
+
+    async def _watch(self, peer, remote):
+        """Reports the local peer's state to the other process and closes the channel once it disconnects.
+        """
+        while peer.active and remote.active:
+            self._send_state(peer, remote)
+            await asyncio.sleep(self.stateInterval)
+        if self.channels.get(remote.id, (None, None))[1] is remote:
+            del self.channels[remote.id]
+            if not remote.closed:
+                remote.closed = True
+                self.closing[remote.id] = self.closing.get(remote.id, 0) + 1
+                self.outQ.put_nowait((remote.id, None))
+
+    def _send_state(self, peer, remote):
+        """Queues a STATE frame describing the local peer.
+        """
+        now = self.clock()
+        latencyAge = NO_SAMPLE
+        if peer.linkLatencyTime is not None:
+            latencyAge = _us(now - peer.linkLatencyTime)
+        wait = peer.get_sync_wait()
+        pendingAge = _us(wait) if wait else NO_SAMPLE
+        state = pack(STATE_FORMAT, peer.get_backlog(), _us(peer.linkLatency), latencyAge, pendingAge)
+        self.outQ.put_nowait((remote.id, state))
+
+    def _on_frame(self, peer, remote, count, payload):
+        """Handles a frame received for an attached channel.
+        """
+        if count == STATE:
+            remote._on_state(payload)
+            return
+        if not count:
+            # the other side closed the pair, free the channel and answer the close
+            remote.closed = True
+            del self.channels[remote.id]
+            self.outQ.put_nowait((remote.id, None))
+            return
+        for offset in range(0, count * 8, 8):
+            raw_packet = payload[offset:offset + 8]
+            if raw_packet[0] == C_STATUS:
+                remote.peerstatus = FixedInt(raw_packet[1], 8)
+                if getattr(peer, 'throttled', False):
+                    # the local emulator is being held paused, keep it that way until it is resumed
+                    raw_packet = raw_packet[:1] + bytes((int(peer._paused_status(remote.peerstatus)) & 0xFF,)) + raw_packet[2:]
+            peer.send_packet(raw_packet)
+
+    def _hold(self, channel, count, payload):
+        """Holds a frame received for a channel that isn't attached yet.
+        """
+        if not count:
+            # the pair closed before this side attached, nothing held for it will be wanted
+            self.early.pop(channel, None)
+            self.earlyState.pop(channel, None)
+            self.outQ.put_nowait((channel, None))
+            return
+        if channel not in self.early and channel not in self.earlyState and len(self.early.keys() | self.earlyState.keys()) >= self.maxEarlyChannels:
+            self.logger.warning('Dropping frame for unattached channel %s, too many channels waiting to be attached.', channel)
+            return
+        if count == STATE:
+            self.earlyState[channel] = payload
+            return
+        early = self.early.setdefault(channel, [0, deque()])
+        early[0] += count
+        early[1].append((count, payload))
+        while early[0] > self.maxEarlyPackets:
+            self.logger.warning('Dropping early frames for unattached channel %s.', channel)
+            early[0] -= early[1].popleft()[0]
+
+    async def _read_loop(self):
+        """The asynchronous read loop.
+        """
+        try:
+            while self.active:
+                try:
+                    (channel, count) = unpack(HEADER, await self.reader.readexactly(HEADER_SIZE))
+                    size = STATE_SIZE if count == STATE else count * 8
+                    payload = await self.reader.readexactly(size) if size else b''
+                except asyncio.exceptions.IncompleteReadError:
+                    self.logger.error('Bridge to %s closed.', self.name)
+                    break
+                except ConnectionResetError:
+                    self.logger.error('Bridge to %s reset unexpectedly.', self.name)
+                    break
+                if self.closing.get(channel):
+                    # everything up to the answer to our close was sent by the pair that closed
+                    if not count:
+                        self.closing[channel] -= 1
+                        if not self.closing[channel]:
+                            del self.closing[channel]
+                    continue
+                pair = self.channels.get(channel)
+                if pair is None:
+                    self._hold(channel, count, payload)
+                    continue
+                self._on_frame(pair[0], pair[1], count, payload)
+        finally:
+            self.writer.close()
+            self.active = False
+            self.wtask.cancel()
+
+    async def _write_loop(self):
+        """The asynchronous write loop, batching everything queued since the last write.
+        """
+        while self.active:
+            item = await self.outQ.get()
+            items = [item]
+            while not self.outQ.empty():
+                items.append(self.outQ.get_nowait())
+            chunks = []
+            channel = None
+            run = []
+            for (itemChannel, raw_packet) in items:
+                control = raw_packet is None or len(raw_packet) != 8
+                if run and (control or itemChannel != channel or len(run) == MAX_FRAME_PACKETS):
+                    chunks.append(pack(HEADER, channel, len(run)))
+                    chunks.extend(run)
+                    run = []
+                channel = itemChannel
+                if raw_packet is None:
+                    chunks.append(pack(HEADER, channel, 0))
+                elif control:
+                    chunks.append(pack(HEADER, channel, STATE))
+                    chunks.append(raw_packet)
+                else:
+                    run.append(raw_packet)
+            if run:
+                chunks.append(pack(HEADER, channel, len(run)))
+                chunks.extend(run)
+            self.writer.write(b''.join(chunks))
+            for (itemChannel, raw_packet) in items:
+                if raw_packet is not None and len(raw_packet) == 8:
+                    pair = self.channels.get(itemChannel)
+                    if pair:
+                        pair[1].queued -= 1
+            await self.writer.drain()
+            for _ in items:
+                self.outQ.task_done()
+
+async def open_bridge(host, port = None):
+    """Connects to a bridge server.
+
+    Args:
+        host (str): Hostname or IP address, or a unix socket path if port is None
+        port (int, optional): Port number. Defaults to None.
+
+    Returns:
+        pyBGBLink.bridge.Bridge: The started bridge
+    """
+    if port is None:
+        reader, writer = await asyncio.open_unix_connection(host)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    bridge = Bridge(reader, writer)
+    bridge.start()
+    return bridge
+
+async def start_bridge_server(callback, host, port = None):
+    """Listens for bridge connections from other processes.
+
+    Args:
+        callback (coroutine function): Called with each started Bridge as it connects
+        host (str): Address to listen on, or a unix socket path if port is None
+        port (int, optional): Port number. Defaults to None.
+
+    Returns:
+        asyncio.Server: The listening server
+    """
+    async def on_connected(reader, writer):
+        bridge = Bridge(reader, writer)
+        bridge.start()
+        await callback(bridge)
+    if port is None:
+        return await asyncio.start_unix_server(on_connected, host)
+    return await asyncio.start_server(on_connected, host, port)
@@ -22,15 +22,17 @@ from .peers import Peer
 class Client:
     """A simple BGBLink compatible client.
     """
-    def __init__(self, peerClass = Peer):
+    def __init__(self, peerClass = Peer, network = None):
         """Initializes the Client class.
 
         Args:
             peerClass (Peer, optional): The peer class to be used for this connection. Defaults to Peer.
+            network (Object, optional): Provides open_connection, eg. a SimulatedNetwork. Defaults to asyncio.
         """
         self.logger = logging.getLogger(self.__class__.__name__)
         self.PeerClass = peerClass
         self.peer = None
+        self.network = network or asyncio
 
     def send_packet(self, raw_packet):
         """Sends a single packet to the connected peer, or discards it if no peers are connected.
@@ -53,19 +55,17 @@ class Client:
         while not self.peer:
             self.logger.info('Connecting to server %s:%s', self.host, self.port)
             try:
-                reader, writer = await asyncio.open_connection(host, port)
+                reader, writer = await self.network.open_connection(host, port)
                 self.peer = self.PeerClass(reader, writer, None)                
             except ConnectionRefusedError:
                 self.logger.info('Connection refused, trying again in 1 second')
                 await asyncio.sleep(1)
         self.logger.info('Client connected to server %s', self.peer.name)
 
-        loop = asyncio.get_event_loop()
-        rtask = loop.create_task(self.peer._read_loop())
-        wtask = loop.create_task(self.peer._write_loop())
+        rtask = asyncio.create_task(self.peer._read_loop())
+        wtask = asyncio.create_task(self.peer._write_loop())
 
-        while not rtask.done():
-            await asyncio.sleep(0.1)
+        await asyncio.wait([rtask])
 
         wtask.cancel()
         self.logger.info('Client disconnected from server %s', self.peer.name)
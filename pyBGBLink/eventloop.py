@@ -0,0 +1,81 @@
+# pyBGBLink/eventloop.py
+#
+#Copyright 2020 @digital-pet
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+import asyncio
+import os
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+# event loop implementations which can be selected, 'auto' prefers uvloop when it is installed
+LOOPS = ('auto', 'asyncio', 'uvloop')
+
+def loop_name(name = None):
+    """loop_name: Resolves a requested loop implementation to the one that will be used
+
+    Args:
+        name (str, optional): One of LOOPS. Defaults to the BGBLINK_LOOP environment variable, or 'auto'.
+
+    Raises:
+        ValueError: The loop implementation is unknown
+        ImportError: uvloop was requested but is not installed
+
+    Returns:
+        str: 'uvloop' or 'asyncio'
+    """
+    name = name or os.environ.get('BGBLINK_LOOP', 'auto')
+    if name not in LOOPS:
+        raise ValueError('Unknown event loop implementation %r, expected one of %s' % (name, ', '.join(LOOPS)))
+    if name == 'uvloop' and uvloop is None:
+        raise ImportError('The uvloop event loop was requested but uvloop is not installed')
+    if name == 'asyncio' or uvloop is None:
+        return 'asyncio'
+    return 'uvloop'
+
+def loop_factory(name = None):
+    """loop_factory: Returns a function creating new event loops of a loop implementation
+
+    Nothing process wide is changed, the factory is meant for asyncio.Runner(loop_factory=...).
+
+    Args:
+        name (str, optional): One of LOOPS. Defaults to the BGBLINK_LOOP environment variable, or 'auto'.
+
+    Returns:
+        callable: uvloop.new_event_loop or asyncio.new_event_loop
+    """
+    if loop_name(name) == 'uvloop':
+        return uvloop.new_event_loop
+    return asyncio.new_event_loop
+
+def run(main, loop = None):
+    """run: Runs a coroutine like asyncio.run, on a new loop of the selected implementation
+
+    Args:
+        main (coroutine): The coroutine to run
+        loop (str, optional): One of LOOPS. Defaults to the BGBLINK_LOOP environment variable, or 'auto'.
+
+    Returns:
+        The result of the coroutine
+    """
+    try:
+        factory = loop_factory(loop)
+    except (ValueError, ImportError):
+        main.close()
+        raise
+    with asyncio.Runner(loop_factory=factory) as runner:
+        return runner.run(main)
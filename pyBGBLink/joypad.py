@@ -0,0 +1,150 @@
+# pyBGBLink/joypad.py
+#
+#Copyright 2020 @digital-pet
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+import asyncio
+from struct import pack
+
+from .protocol import defines
+
+# raw joypad packets for every button transition, indexed by button number
+PRESS = tuple(pack('=bbbbi', defines.C_JOYPAD, button | int(defines.B_ISPRESSED), 0, 0, 0) for button in range(8))
+RELEASE = tuple(pack('=bbbbi', defines.C_JOYPAD, button, 0, 0, 0) for button in range(8))
+
+# raw packets needed to go from one state to another, keyed by (old, new)
+_transitions = {}
+
+def _transition(old, new):
+    """_transition: Returns the packets that move the joypad from one state to another
+
+    Args:
+        old (int): The current button mask
+        new (int): The wanted button mask
+
+    Returns:
+        tuple: Raw joypad packets, one per button that changes
+    """
+    key = (old, new)
+    packets = _transitions.get(key)
+    if packets is None:
+        changed = old ^ new
+        packets = tuple((PRESS if new & (1 << button) else RELEASE)[button] for button in range(8) if changed & (1 << button))
+        _transitions[key] = packets
+    return packets
+
+def button_mask(*buttons):
+    """button_mask: Builds a button mask from button numbers
+
+    Args:
+        *buttons (int): Button numbers, eg. defines.B_A
+
+    Returns:
+        int: A mask with bit n set for each button n
+    """
+    mask = 0
+    for button in buttons:
+        mask |= 1 << int(button)
+    return mask
+
+class JoypadState:
+    """JoypadState: Tracks the buttons held on a remote emulator and only sends changes.
+
+    The state is an 8-bit mask where bit n is set while button n (B_RIGHT through B_START) is
+    pressed. Changing the state sends one JoypadPacket for each button that actually changes, so
+    repeated presses or releases of the same button are never sent.
+
+    Args:
+        target (Object): Anything with a send_packet method, eg. a Peer, Client or Server.
+        state (int, optional): The button mask the emulator is assumed to start with. Defaults to 0.
+    """
+    def __init__(self, target, state = 0):
+        self.target = target
+        self.state = state
+
+    def set_state(self, mask):
+        """set_state: Changes the held buttons to exactly those in mask
+
+        Args:
+            mask (int): The wanted button mask
+
+        Returns:
+            int: The number of packets sent
+        """
+        mask &= 0xFF
+        if mask == self.state:
+            return 0
+        packets = _transition(self.state, mask)
+        self.state = mask
+        for raw_packet in packets:
+            self.target.send_packet(raw_packet)
+        return len(packets)
+
+    def press(self, *buttons):
+        """press: Presses buttons, leaving any other held buttons held
+
+        Args:
+            *buttons (int): Button numbers, eg. defines.B_A
+
+        Returns:
+            int: The number of packets sent
+        """
+        return self.set_state(self.state | button_mask(*buttons))
+
+    def release(self, *buttons):
+        """release: Releases buttons, leaving any other held buttons held
+
+        Args:
+            *buttons (int): Button numbers, eg. defines.B_A
+
+        Returns:
+            int: The number of packets sent
+        """
+        return self.set_state(self.state & ~button_mask(*buttons))
+
+    async def tap(self, *buttons, duration = 0.025):
+        """tap: Presses buttons, waits, then releases them
+
+        Args:
+            *buttons (int): Button numbers, eg. defines.B_A
+            duration (float, optional): Seconds to hold the buttons for. Defaults to 0.025.
+        """
+        self.press(*buttons)
+        await asyncio.sleep(duration)
+        self.release(*buttons)
+
+def set_states(states, mask):
+    """set_states: Changes the held buttons of many JoypadStates to the same mask
+
+    Trackers that share a current state share the same precomputed packets.
+
+    Args:
+        states (iterable of JoypadState): The trackers to update
+        mask (int): The wanted button mask
+
+    Returns:
+        int: The total number of packets sent
+    """
+    mask &= 0xFF
+    sent = 0
+    for joypad in states:
+        if joypad.state == mask:
+            continue
+        packets = _transition(joypad.state, mask)
+        joypad.state = mask
+        send_packet = joypad.target.send_packet
+        for raw_packet in packets:
+            send_packet(raw_packet)
+        sent += len(packets)
+    return sent
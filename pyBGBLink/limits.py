@@ -0,0 +1,71 @@
+# pyBGBLink/limits.py
+#
+#Copyright 2020 @digital-pet
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+import asyncio
+
+def _loop_time():
+    return asyncio.get_running_loop().time()
+
+class TokenBucket:
+    """TokenBucket: A simple token bucket rate limiter.
+
+    Args:
+        rate (float): Tokens added per second.
+        burst (float, optional): Maximum tokens held. Defaults to rate.
+        clock (callable, optional): Returns the current time in seconds. Defaults to the running event loop's clock.
+    """
+    def __init__(self, rate, burst = None, clock = None):
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = self.burst
+        self.clock = clock or _loop_time
+        self.updated = None
+
+    def _refill(self):
+        now = self.clock()
+        if self.updated is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_consume(self, n = 1):
+        """try_consume: Takes n tokens if they are all available
+
+        Args:
+            n (int, optional): Number of tokens to take. Defaults to 1.
+
+        Returns:
+            bool: True if the tokens were taken, False if the bucket is short
+        """
+        self._refill()
+        if self.tokens >= n:
+            self.tokens -= n
+            return True
+        return False
+
+    def consume(self, n = 1):
+        """consume: Takes n tokens unconditionally, going into debt if necessary
+
+        Args:
+            n (int, optional): Number of tokens to take. Defaults to 1.
+
+        Returns:
+            float: Seconds to wait until the bucket is out of debt, 0.0 if it never went into debt
+        """
+        self._refill()
+        self.tokens -= n
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
@@ -17,11 +17,19 @@
 
 import asyncio
 
-from .protocol import BGBProtocol, VersionPacket, StatusPacket
+from uint import Int as FixedInt
+
+from .protocol import BGBProtocol, VersionPacket, StatusPacket, defines
+from .stream import PacketStream
+from .trace import tracer
+
+C_SYNC1 = int(defines.C_SYNC1)
 
 class Peer(BGBProtocol):
     """A basic BGBLink-compatible peer.
 
+    Packets can be consumed either by overriding the _on_* handlers or in batches through packets().
+
     Args:
         reader (asyncio.streams.Reader): The reader associated with this connection.
         writer (asyncio.streams.Writer): The writer associated with this connection.
@@ -30,6 +38,9 @@ class Peer(BGBProtocol):
     Inherits:
         BGBProtocol
     """
+    readSize = 4096     # maximum bytes taken from the reader per read
+    syncTimeout = 2.0   # seconds before an unanswered sync1 is given up on
+
     def __init__(self, reader, writer, PeerID):
         self.active = True
         super().__init__()
@@ -40,6 +51,14 @@ class Peer(BGBProtocol):
         self.ownstatus = self.defines.S_SUPPORT_WANTDISCONNECT
         self.peerstatus = None
         self.outQ = asyncio.Queue()
+        self.clock = asyncio.get_running_loop().time
+        self.syncSent = None                # send time of the last sync1 packet, until its sync2 reply arrives
+        self.linkLatency = 0.0              # the most recent sync1 -> sync2 round trip
+        self.linkLatencyTime = None         # when linkLatency was measured
+        self.streams = []
+        self.exclusive = [0] * 256  # number of exclusive streams taking each command away from the handlers
+        self.packetLimit = None     # optional TokenBucket limiting inbound packets per second
+        self.rateLimitedReads = 0
 
         # version packet should be sent immediately
         version = VersionPacket()
@@ -48,24 +67,64 @@ class Peer(BGBProtocol):
     async def _read_loop(self):
         """The asynchronous read loop.
         """
-        while self.active:
-            try:
-                buffer = await self.reader.readexactly(8)
-                self._on_packet_received(buffer)
-            except asyncio.exceptions.IncompleteReadError:
-                self.logger.error('IncompleteReadError encountered from peer id %s (%s).', self.id, self.name)
-                break
-            except ConnectionResetError:
-                self.logger.error('Connection reset unexpectedly with peer id %s (%s).', self.id, self.name)
-                break
-        self.writer.close()
-        self.active = False
+        leftover = b''
+        try:
+            while self.active:
+                try:
+                    data = await self.reader.read(self.readSize)
+                except ConnectionResetError:
+                    self.logger.error('Connection reset unexpectedly with peer id %s (%s).', self.id, self.name)
+                    if tracer.enabled and tracer.dumpOnError:
+                        tracer.log(self.id)
+                    break
+                if not data:
+                    if leftover:
+                        self.logger.error('IncompleteReadError encountered from peer id %s (%s).', self.id, self.name)
+                        if tracer.enabled and tracer.dumpOnError:
+                            tracer.log(self.id)
+                    break
+                if leftover:
+                    data = leftover + data
+                # only whole packets are dispatched, any partial packet waits for the next read
+                end = len(data) - (len(data) % 8)
+                leftover = data[end:]
+                buffer = memoryview(data)
+                if tracer.enabled:
+                    tracer.record_batch(self.id, tracer.IN, buffer, end)
+                exclusive = self.exclusive
+                for offset in range(0, end, 8):
+                    if exclusive[buffer[offset]]:
+                        continue
+                    self._on_packet_received(buffer[offset:offset + 8])
+                    if not self.active:
+                        break
+                for stream in self.streams:
+                    stream._feed(buffer, end)
+                for stream in self.streams:
+                    if stream.full():
+                        # a slow consumer stops the read loop, the socket buffers push back on the sender
+                        await stream.space.wait()
+                if self.packetLimit:
+                    delay = self.packetLimit.consume(end // 8)
+                    if delay:
+                        # stop reading until the peer is back under its limit, the socket buffers push back on the sender
+                        self.rateLimitedReads += 1
+                        await asyncio.sleep(delay)
+        finally:
+            self.writer.close()
+            self.active = False
+            if tracer.enabled and tracer.dumpOnDisconnect:
+                tracer.log(self.id)
+            for stream in self.streams:
+                stream._close()
         
     async def _write_loop(self):
         """The asynchronous write loop.
         """
         while self.active:
             raw_packet = await self.outQ.get()
+            if tracer.enabled:
+                tracer.record(self.id, tracer.OUT, raw_packet)
             self.writer.write(raw_packet)
             await self.writer.drain()
             self.outQ.task_done()
@@ -94,17 +153,122 @@ class Peer(BGBProtocol):
         super()._on_status(packet)
         self.peerstatus = packet.b1
 
+    def _on_sync2(self, packet):
+        """The handler for Sync2Packet packets
+
+        Args:
+            packet (pyBGBLink.protocol.Sync2Packet): A Sync2Packet object
+        """
+        super()._on_sync2(packet)
+        if self.syncSent is not None:
+            now = self.clock()
+            if now - self.syncSent <= self.syncTimeout:
+                self.linkLatency = now - self.syncSent
+                self.linkLatencyTime = now
+            self.syncSent = None
+
+    def get_link_latency(self, since = None):
+        """Returns the round trip latency of the link to the connected emulator.
+
+        Latency is measured from sending a sync1 packet to receiving the emulator's sync2 reply,
+        including any time the sync1 spent queued. A serial transfer has to complete before the
+        next one starts, so each reply answers the most recent sync1, and a sync1 that is never
+        answered is simply replaced by the next one.
+
+        Args:
+            since (float, optional): Ignore round trips measured before this clock time. Defaults to None.
+
+        Returns:
+            float: Latency in seconds, 0.0 if no round trip has been measured since then
+        """
+        if self.linkLatencyTime is not None and (since is None or self.linkLatencyTime >= since):
+            return self.linkLatency
+        return 0.0
+
+    def get_sync_wait(self):
+        """Returns how long the last sync1 packet has been waiting for its reply.
+
+        Returns:
+            float: Seconds waited, 0.0 if no sync1 is waiting or it has been given up on after syncTimeout
+        """
+        if self.syncSent is None:
+            return 0.0
+        wait = self.clock() - self.syncSent
+        if wait > self.syncTimeout:
+            self.syncSent = None
+            return 0.0
+        return wait
+
+    def get_backlog(self):
+        """Returns the number of packets waiting to be sent to the connected emulator.
+
+        Returns:
+            int: Queued packets
+        """
+        return self.outQ.qsize()
+
     def send_packet(self, raw_packet):
         """Schedules a packet to be sent to the connected peer.
 
         Args:
             raw_packet (Bytes): An assembled BGBLink packet
         """
+        if raw_packet[0] == C_SYNC1:
+            self.syncSent = self.clock()
         self.outQ.put_nowait(raw_packet)
 
+    async def packets(self, types = None, max_batch = 64, raw = False, exclusive = False, max_pending = 4096):
+        """Asynchronously iterates over batches of received packets.
+
+        Each batch holds the matching packets from one or more reads, in the order they were received.
+        By default packet handlers still run for every packet and the stream is an additional consumer.
+        An exclusive stream takes its packets away from the handlers, so they are only decoded once (or
+        not at all when raw is set). Version and status packets are always given to the handlers so the
+        handshake keeps working.
+
+        If a stream holds max_pending packets the read loop waits for the consumer to catch up.
+
+        Usage:
+            async for batch in peer.packets(types=[defines.C_JOYPAD], exclusive=True):
+                ...
+
+        Args:
+            types (iterable of int, optional): Command numbers to deliver. Defaults to None (all commands).
+            max_batch (int, optional): Maximum number of packets per batch. Defaults to 64.
+            raw (bool, optional): Yield raw 8-byte memoryviews instead of packet objects. Defaults to False.
+            exclusive (bool, optional): Skip the _on_* handlers for packets this stream delivers. Defaults to False.
+            max_pending (int, optional): Packets held for the consumer before reading pauses. Defaults to 4096.
+
+        Yields:
+            list: A batch of packet objects, or of memoryviews if raw is set
+        """
+        stream = PacketStream(self.packetClasses, types, max_batch, raw, max_pending)
+        if not self.active:
+            stream._close()
+        taken = []
+        if exclusive:
+            kept = (int(self.defines.C_VERSION), int(self.defines.C_STATUS))
+            taken = [ptype for ptype in range(256) if stream.filter[ptype] and ptype not in kept]
+            for ptype in taken:
+                self.exclusive[ptype] += 1
+        self.streams.append(stream)
+        try:
+            async for batch in stream:
+                yield batch
+        finally:
+            self.streams.remove(stream)
+            for ptype in taken:
+                self.exclusive[ptype] -= 1
+            stream._close()
+
 class ProxyPeer(Peer):
     """ProxyPeer: A more advanced BGBLink Peer which proxies data to an associated peer if one if provided.
 
+    When the associated peer falls behind (its outbound queue or the sync round trip to its
+    emulator crosses the high watermark), the emulator connected to this peer is sent a paused
+    status until the associated peer drops back below the low watermarks. The watermarks are class
+    attributes and may be overridden by subclasses.
+
     Args:
         reader (Object, asyncio.streams.Reader): The reader associated with this connection.
         writer (Object, asyncio.streams.Writer): The writer associated with this connection.
@@ -113,9 +277,19 @@ class ProxyPeer(Peer):
     Inherits:
         Peer
     """
+    highWatermark = 64          # queued packets on the associated peer before throttling
+    lowWatermark = 16           # queued packets on the associated peer before resuming
+    highLatency = 0.05          # associated peer sync round trip (seconds) before throttling
+    lowLatency = 0.01           # associated peer unanswered sync age (seconds) before resuming
+    flowCheckInterval = 0.05    # seconds between flow control checks
+
     def __init__(self, reader, writer, PeerID):    
         super().__init__(reader, writer, PeerID)
         self.peer = None
+        self.throttled = False
+        self.throttleStart = None
+        self.throttledTime = 0.0
+        self.resumedAt = None
 
     def _on_sync1(self, packet):
         """_on_sync1: The handler for Sync1Packet packets
@@ -155,8 +329,20 @@ class ProxyPeer(Peer):
         """
         super()._on_status(packet)
         if self.peer:
+            if getattr(self.peer, 'throttled', False):
+                # the associated peer is being held paused, keep it that way until it is resumed
+                packet.b1 = self._paused_status(packet.b1)
             self.peer.send_packet(packet.assemble())
     
+    def _on_passthrough(self, raw_packet):
+        """_on_passthrough: The handler for unknown packets under the PASSTHROUGH policy
+
+        Args:
+            raw_packet (Bytes): A raw BGBLink protocol packet
+        """
+        if self.peer:
+            self.peer.send_packet(bytes(raw_packet))
+
     def _on_want_disconnect(self, packet):
         """_on_want_disconnect: The handler for WantDiscoonectPacket packets
 
@@ -183,6 +369,84 @@ class ProxyPeer(Peer):
         """_maintain_connection: Asynchronously monitors the connection between peers
         """
         while self.peer:
+            if not self.active:
+                # this side is gone, the partner's own watch releases it
+                self.peer = None
+                self._end_throttle()
+                self.logger.info('Peer id %s (%s) spent %.3fs throttled.', self.id, self.name, self.throttledTime)
+                break
             if not self.peer.active:
+                partner = self.peer
                 self.peer = None
-            asyncio.sleep(0.1)
\ No newline at end of file
+                if self.throttled:
+                    # nothing is left to wait for, give the emulator back its partner's last real status
+                    self._end_throttle()
+                    status = StatusPacket()
+                    status.b1 = partner.peerstatus or partner.ownstatus
+                    self.send_packet(status.assemble())
+                self.logger.info('Peer id %s (%s) spent %.3fs throttled.', self.id, self.name, self.throttledTime)
+                break
+            self._check_flow()
+            await asyncio.sleep(self.flowCheckInterval)
+
+    def _check_flow(self):
+        """_check_flow: Pauses or resumes the emulator behind this peer based on the associated peer's backlog
+
+        Throttling starts when the associated peer crosses either high watermark and only ends once
+        it is back below both low watermarks, so the pair doesn't flap around a single threshold.
+        While throttled no new syncs reach the associated peer, so resuming waits for a sync still in
+        flight to be answered or given up on, and only round trips measured after resuming can
+        throttle again.
+        """
+        backlog = self.peer.get_backlog()
+        if not self.throttled:
+            latency = self.peer.get_link_latency(since=self.resumedAt)
+            if backlog >= self.highWatermark or latency >= self.highLatency:
+                self.throttled = True
+                self.throttleStart = self.clock()
+                self.logger.info('Throttling peer id %s (%s), peer id %s has backlog %s and latency %.3fs.', self.id, self.name, self.peer.id, backlog, latency)
+                status = StatusPacket()
+                status.b1 = self._paused_status(self.peer.peerstatus or self.peer.ownstatus)
+                self.send_packet(status.assemble())
+        elif backlog <= self.lowWatermark and self.peer.get_sync_wait() <= self.lowLatency:
+            duration = self._end_throttle()
+            self.resumedAt = self.clock()
+            self.logger.info('Resuming peer id %s (%s) after %.3fs throttled.', self.id, self.name, duration)
+            status = StatusPacket()
+            status.b1 = self.peer.peerstatus or self.peer.ownstatus
+            self.send_packet(status.assemble())
+
+    def _end_throttle(self):
+        """_end_throttle: Clears the throttled state and accounts for the time spent throttled
+
+        Returns:
+            float: The length of the throttle period that just ended in seconds, or 0.0 if not throttled
+        """
+        if not self.throttled:
+            return 0.0
+        duration = self.clock() - self.throttleStart
+        self.throttledTime += duration
+        self.throttled = False
+        self.throttleStart = None
+        return duration
+
+    def get_throttled_time(self):
+        """get_throttled_time: Returns the total time this peer has spent throttled
+
+        Returns:
+            float: Total throttled time in seconds, including any throttle period still in progress
+        """
+        if self.throttled:
+            return self.throttledTime + (self.clock() - self.throttleStart)
+        return self.throttledTime
+
+    def _paused_status(self, status):
+        """_paused_status: Converts a status byte into the equivalent paused status byte
+
+        Args:
+            status (Object, uint.Int): A status byte
+
+        Returns:
+            Object, uint.Int: The status byte with the running bit cleared and the paused bit set
+        """
+        return FixedInt((int(status) | int(self.defines.S_ISPAUSED)) & ~int(self.defines.S_ISRUNNING), 8)
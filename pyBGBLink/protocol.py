@@ -19,6 +19,8 @@ from types import SimpleNamespace
 from struct import *
 from uint import Int as FixedInt
 
+from .trace import tracer
+
 defines = SimpleNamespace(
             # version numbering
             MAJOR_VER                   = FixedInt(0x01, 8),
@@ -53,15 +55,27 @@ class BGBProtocol:
     Provides a dispatcher method and events for each packet type. This class is not designed to
     be instantiated directly but should be subclassed to provide the necessary functionality.
 
+    Every packet is validated against a 256 entry dispatch table before it is decoded. Packets with
+    a command outside the table are counted in errors by command, packets whose handler raises are
+    logged and counted under (command, 'handler'), and both are handled according to unknownPolicy,
+    or the entry for their command in unknownPolicies:
+        DROP:           the packet is discarded
+        PASSTHROUGH:    the raw packet is given to _on_passthrough (proxies forward it to their partner)
+        DISCONNECT:     the connection is closed
+
     Notes:
         Numbering of elements in this implementation starts at zero, while the official 
         protocol specification starts numbering elements at one.
     
     """
+    DROP = 0
+    PASSTHROUGH = 1
+    DISCONNECT = 2
+
     def __init__(self):
         self.logger = logging.getLogger(self.__class__.__name__)
         self.defines = defines
-        self.packets = {
+        self.packetClasses = {
             1 : VersionPacket,
             101 : JoypadPacket,
             104 : Sync1Packet,
@@ -77,16 +91,58 @@ class BGBProtocol:
             106 : self._on_sync3,
             108 : self._on_status,
             109 : self._on_want_disconnect}
+        self.dispatch = [None] * 256
+        for ptype in self.packetClasses:
+            self.dispatch[ptype] = (self.packetClasses[ptype], self.handlers[ptype])
+        self.unknownPolicy = self.DROP
+        self.unknownPolicies = {}
+        self.errors = {}
 
     def _on_packet_received(self, raw_packet):
-        """_on_packet_received - Unpacks raw bytes objects and calls the relevant event handler
+        """_on_packet_received - Validates raw bytes objects and calls the relevant event handler
+
+        Args:
+            raw_packet (Bytes): A raw BGBLink protocol packet.
+        """
+        ptype = raw_packet[0]
+        entry = self.dispatch[ptype]
+        if entry is None:
+            self._on_invalid(ptype, raw_packet)
+            return
+        try:
+            entry[1](entry[0](raw_packet))
+        except Exception:
+            self.logger.exception('Handler for command 0x%02X failed on packet %s.', ptype, bytes(raw_packet).hex())
+            self._on_invalid(ptype, raw_packet, 'handler')
+
+    def _on_invalid(self, ptype, raw_packet, reason = None):
+        """_on_invalid: Applies the unknown packet policy to a packet which could not be handled
 
         Args:
+            ptype (int): The command byte of the packet
             raw_packet (Bytes): A raw BGBLink protocol packet.
+            reason (str, optional): 'handler' if the packet's handler raised. Defaults to None (unknown command).
         """
-        (ptype,) = unpack('=bxxxxxxx',raw_packet)
-        packet = self.packets[ptype](raw_packet)
-        self.handlers[ptype](packet)
+        key = ptype if reason is None else (ptype, reason)
+        self.errors[key] = self.errors.get(key, 0) + 1
+        policy = self.unknownPolicies.get(ptype, self.unknownPolicy)
+        if policy == self.PASSTHROUGH:
+            self._on_passthrough(raw_packet)
+        elif policy == self.DISCONNECT:
+            self.logger.error('Disconnecting after invalid packet with command 0x%02X.', ptype)
+            self.active = False
+            if tracer.enabled and tracer.dumpOnError:
+                tracer.log(getattr(self, 'id', None))
+        # DROP: the packet is only counted
+
+    def _on_passthrough(self, raw_packet):
+        """_on_passthrough: Event handler for unknown packets under the PASSTHROUGH policy
+
+        Args:
+            raw_packet (Bytes): A raw BGBLink protocol packet.
+        """
+        #do nothing
+        pass
 
     def _on_version(self, packet, *args, **kwargs):
         """_on_version: Event handler for [packet] packets
@@ -208,7 +264,7 @@ class GenericPacket:
             self.b1 = FixedInt(b1, 8)
             self.b2 = FixedInt(b2, 8)
             self.b3 = FixedInt(b3, 8)
-            self.i0 = FixedInt(i0, 8)
+            self.i0 = FixedInt(i0, 32)
 
     def assemble(self):
         """assemble Assembles the packet into a Bytes object
@@ -307,14 +363,14 @@ class Sync1Packet(GenericPacket):
         Returns:
             Bytes: a raw BGBLink packet
         """
-        self.b1 = FixedInt(self.data, 8)
+        self.b1 = FixedInt(int(self.data), 8)
         #sanity check, bits 1 and 7 of b2 should always be 1
         self.b2 = self.b2 | -127
         #add the highspeed bit
         self.b2 = self.b2 | (int(self.highspeed) * 2)
         #add the doublespeed bit
         self.b2 = self.b2 | (int(self.doublespeed) * 4)
-        self.i0 = self.timestamp
+        self.i0 = FixedInt(int(self.timestamp), 32)
         return super().assemble()
         
 
@@ -338,7 +394,7 @@ class Sync2Packet(GenericPacket):
         Returns:
             Bytes: a raw BGBLink packet
         """
-        self.b1 = FixedInt(self.data, 8)
+        self.b1 = FixedInt(int(self.data), 8)
         #sanity check, b2 should always be 0x80
         self.b2 = FixedInt(0x80, 8)
         return super().assemble()
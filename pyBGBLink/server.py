@@ -17,10 +17,29 @@
 import asyncio
 import logging
 
+from .limits import TokenBucket
 from .peers import Peer, ProxyPeer
 
 class Server:
-    def __init__(self, host, port, peerClass = Peer):
+    """A BGBLink compatible server.
+
+    Connections are checked against the admission limits before a peer is created for them, and
+    rejected connections are closed immediately. Any limit left as None is not enforced.
+
+    Args:
+        host (str): Address to listen on
+        port (int): Port to listen on
+        peerClass (Peer, optional): The peer class to be used for connections. Defaults to Peer.
+        maxPeers (int, optional): Maximum number of connected peers. Defaults to None.
+        maxPeersPerIP (int, optional): Maximum number of connected peers from a single address. Defaults to None.
+        connectRate (float, optional): Accepted connections per second across all addresses. Defaults to None.
+        connectBurst (int, optional): Connections accepted in a burst before connectRate applies. Defaults to connectRate.
+        packetRate (float, optional): Inbound packets per second allowed for each peer. Defaults to None.
+        packetBurst (int, optional): Packets accepted in a burst before packetRate applies. Defaults to packetRate.
+        network (Object, optional): Provides start_server, eg. a SimulatedNetwork. Defaults to asyncio.
+    """
+    def __init__(self, host, port, peerClass = Peer, maxPeers = None, maxPeersPerIP = None,
+                 connectRate = None, connectBurst = None, packetRate = None, packetBurst = None, network = None):
         self.logger = logging.getLogger(self.__class__.__name__)
         self.host = host
         self.port = port
@@ -28,27 +47,90 @@ class Server:
         self.peers = {}
         self.connLock = asyncio.Lock()
         self.nextID = 0
+        self.network = network or asyncio
+        self.maxPeers = maxPeers
+        self.maxPeersPerIP = maxPeersPerIP
+        self.connectLimit = TokenBucket(connectRate, connectBurst) if connectRate else None
+        self.packetRate = packetRate
+        self.packetBurst = packetBurst
+        self.peerCount = 0
+        self.ipCounts = {}
+        self.rejected = {'maxPeers' : 0, 'maxPeersPerIP' : 0, 'connectRate' : 0}
+        self.throttledPeers = 0
+        self.throttledReads = 0
+
+    def _admit(self, ip):
+        """Checks a new connection against the admission limits.
+
+        Args:
+            ip (str): Source address of the connection
+
+        Returns:
+            str or None: The name of the limit that rejected the connection, or None if it was admitted
+        """
+        if self.maxPeers is not None and self.peerCount >= self.maxPeers:
+            return 'maxPeers'
+        if self.maxPeersPerIP is not None and self.ipCounts.get(ip, 0) >= self.maxPeersPerIP:
+            return 'maxPeersPerIP'
+        if self.connectLimit and not self.connectLimit.try_consume():
+            return 'connectRate'
+        return None
 
     async def _on_client_connected(self, reader, writer):
-        
-        async with self.connLock:
-            i = self.nextID
-            self.nextID += 1
-        newPeer = self.PeerClass(reader, writer, i)
-        self.peers[i] = newPeer
-        self.logger.info('Client id %s (%s) connected',newPeer.id, newPeer.name)
+        ip = (writer.get_extra_info('peername') or (None,))[0]
+        reason = self._admit(ip)
+        if reason:
+            self.rejected[reason] += 1
+            self.logger.debug('Rejected client %s (%s)', ip, reason)
+            writer.transport.abort()
+            return
+        self.peerCount += 1
+        self.ipCounts[ip] = self.ipCounts.get(ip, 0) + 1
 
+        # the counts are released however this ends, including a failing peer class or cancellation
+        newPeer = None
+        tasks = []
+        try:
+            async with self.connLock:
+                i = self.nextID
+                self.nextID += 1
+            newPeer = self.PeerClass(reader, writer, i)
+            if self.packetRate:
+                newPeer.packetLimit = TokenBucket(self.packetRate, self.packetBurst)
+            self.peers[i] = newPeer
+            self.logger.info('Client id %s (%s) connected',newPeer.id, newPeer.name)
 
-        loop = asyncio.get_event_loop()
-        rtask = loop.create_task(newPeer._read_loop())
-        wtask = loop.create_task(newPeer._write_loop())
-        
-        while not rtask.done():
-            await asyncio.sleep(0.1)
-        
-        wtask.cancel()
-        self.logger.info('Client id %s (%s) disconnected',newPeer.id, newPeer.name)
-        del self.peers[i]
+            rtask = asyncio.create_task(newPeer._read_loop())
+            tasks = [rtask, asyncio.create_task(newPeer._write_loop())]
+
+            await asyncio.wait([rtask])
+        finally:
+            for task in tasks:
+                task.cancel()
+            if newPeer is None:
+                writer.transport.abort()
+            else:
+                self.logger.info('Client id %s (%s) disconnected',newPeer.id, newPeer.name)
+                self.peers.pop(newPeer.id, None)
+                if newPeer.rateLimitedReads:
+                    self.throttledPeers += 1
+                    self.throttledReads += newPeer.rateLimitedReads
+            self.peerCount -= 1
+            self.ipCounts[ip] -= 1
+            if not self.ipCounts[ip]:
+                del self.ipCounts[ip]
+
+    def get_stats(self):
+        """Returns the admission control counters.
+
+        Returns:
+            dict: Rejected connections by limit, and the number of peers and reads throttled by packetRate
+        """
+        live = [peer.rateLimitedReads for peer in self.peers.values() if peer.rateLimitedReads]
+        return {
+            'rejected' : dict(self.rejected),
+            'throttledPeers' : self.throttledPeers + len(live),
+            'throttledReads' : self.throttledReads + sum(live)}
 
     def send_packet(self, raw_packet, peerID = None, invert = False):
         if peerID == None:
@@ -62,9 +144,9 @@ class Server:
             self.peers[peerID].send_packet(raw_packet)
 
     async def start(self):
-        await asyncio.start_server(self._on_client_connected, self.host, self.port)
+        await self.network.start_server(self._on_client_connected, self.host, self.port)
         self.logger.info('Server listening on %s:%s',self.host,self.port)
         
 class ProxyServer(Server):
-    def __init__(self, host, port, peerClass = ProxyPeer):
-        super().__init__(host, port, peerClass)
\ No newline at end of file
+    def __init__(self, host, port, peerClass = ProxyPeer, **kwargs):
+        super().__init__(host, port, peerClass, **kwargs)
\ No newline at end of file
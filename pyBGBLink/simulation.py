@@ -0,0 +1,297 @@
+# pyBGBLink/simulation.py
+#
+#Copyright 2020 @digital-pet
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+import asyncio
+import random
+import selectors
+from collections import deque
+
+########################################################################
+# Simulation mode: an event loop running on a virtual clock, and an in-memory
+# network whose links add configurable latency, jitter and loss.
+#
+# Nothing in a simulation touches a real socket, so whenever every task is
+# waiting on a timer the clock jumps straight to the next timer instead of
+# sleeping. Runs are repeatable for a given seed.
+########################################################################
+
+class _VirtualSelector(selectors.BaseSelector):
+    """A selector which never reports I/O and advances the loop's clock instead of waiting.
+    """
+    def __init__(self):
+        self.loop = None
+        self.keys = {}
+
+    def register(self, fileobj, events, data = None):
+        fd = fileobj if isinstance(fileobj, int) else fileobj.fileno()
+        key = selectors.SelectorKey(fileobj, fd, events, data)
+        self.keys[fd] = key
+        return key
+
+    def unregister(self, fileobj):
+        fd = fileobj if isinstance(fileobj, int) else fileobj.fileno()
+        return self.keys.pop(fd)
+
+    def select(self, timeout = None):
+        if timeout is None:
+            raise RuntimeError('Simulation deadlocked: no tasks are runnable and no timers are scheduled')
+        self.loop.clock += timeout
+        return []
+
+    def get_map(self):
+        return self.keys
+
+    def close(self):
+        self.keys.clear()
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    """VirtualClockLoop: An event loop whose time only advances when every task is waiting on a timer.
+
+    Args:
+        start (float, optional): The initial value of the clock in seconds. Defaults to 0.0.
+    """
+    def __init__(self, start = 0.0):
+        selector = _VirtualSelector()
+        self.clock = start
+        super().__init__(selector)
+        selector.loop = self
+
+    def time(self):
+        return self.clock
+
+class LinkModel:
+    """LinkModel: Describes the delay added to data crossing one direction of a simulated link.
+
+    The link behaves like a TCP connection: data always arrives in order, so jitter can delay a write
+    but never lets it overtake an earlier one, and a lost segment is delivered after a retransmission
+    timeout, holding up everything written after it.
+
+    Args:
+        latency (float, optional): One-way delay in seconds. Defaults to 0.0.
+        jitter (float, optional): Maximum extra delay in seconds, drawn uniformly per write. Defaults to 0.0.
+        loss (float, optional): Probability of a write being lost and retransmitted. Defaults to 0.0.
+        retransmit (float, optional): Extra delay in seconds for a lost write. Defaults to 0.2.
+    """
+    def __init__(self, latency = 0.0, jitter = 0.0, loss = 0.0, retransmit = 0.2):
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.retransmit = retransmit
+
+    def delay(self, rng):
+        """delay: Draws the delay for a single write
+
+        Args:
+            rng (random.Random): The simulation's random number generator
+
+        Returns:
+            float: The delay in seconds
+        """
+        delay = self.latency
+        if self.jitter:
+            delay += rng.uniform(0, self.jitter)
+        if self.loss and rng.random() < self.loss:
+            delay += self.retransmit
+        return delay
+
+class _LinkTransport(asyncio.Transport):
+    """One end of a simulated link, delivering writes to the protocol at the other end.
+    """
+    def __init__(self, loop, model, rng, name):
+        super().__init__()
+        self.loop = loop
+        self.model = model
+        self.rng = rng
+        self.name = name
+        self.protocol = None
+        self.remote = None
+        self.closing = False
+        self.nextDelivery = 0.0
+        self.inflight = deque()
+        self.bytesSent = 0
+
+    def get_extra_info(self, name, default = None):
+        if name == 'peername':
+            return self.remote.name
+        if name == 'sockname':
+            return self.name
+        return default
+
+    def _schedule(self, callback, *args):
+        # in-order delivery, a write never arrives before the one before it. Timers due at the same time
+        # don't run in a fixed order, so deliveries are queued and released in order by whichever fires.
+        when = max(self.loop.time() + self.model.delay(self.rng), self.nextDelivery)
+        self.nextDelivery = when
+        self.inflight.append((when, callback, args))
+        self.loop.call_at(when, self._release)
+
+    def _release(self):
+        now = self.loop.time()
+        inflight = self.inflight
+        while inflight and inflight[0][0] <= now:
+            (when, callback, args) = inflight.popleft()
+            callback(*args)
+
+    def _deliver(self, data):
+        if not self.remote.closing:
+            self.remote.protocol.data_received(data)
+
+    def _deliver_eof(self):
+        if not self.remote.closing:
+            self.remote.protocol.eof_received()
+
+    def _deliver_close(self):
+        if not self.remote.closing:
+            self.remote.closing = True
+            self.remote.protocol.connection_lost(None)
+
+    def write(self, data):
+        if self.closing or not data:
+            return
+        self.bytesSent += len(data)
+        self._schedule(self._deliver, bytes(data))
+
+    def write_eof(self):
+        self._schedule(self._deliver_eof)
+
+    def can_write_eof(self):
+        return True
+
+    def is_closing(self):
+        return self.closing
+
+    def close(self):
+        if self.closing:
+            return
+        self.closing = True
+        self._schedule(self._deliver_close)
+        self.loop.call_soon(self.protocol.connection_lost, None)
+
+    def abort(self):
+        self.close()
+
+    def get_write_buffer_size(self):
+        return 0
+
+    def set_write_buffer_limits(self, high = None, low = None):
+        pass
+
+    def pause_reading(self):
+        pass
+
+    def resume_reading(self):
+        pass
+
+    def is_reading(self):
+        return not self.closing
+
+class SimulatedNetwork:
+    """SimulatedNetwork: An in-memory stand-in for the network used by Server and Client.
+
+    Provides start_server and open_connection with the same signatures as the asyncio functions, so
+    it can be passed as the network argument of Server and Client. Must be used on a VirtualClockLoop
+    for time to advance without waiting, although it works on any event loop.
+
+    Args:
+        model (LinkModel, optional): The link model applied in both directions. Defaults to an ideal link.
+        seed (int, optional): Seed for the random number generator used by link models. Defaults to 0.
+    """
+    def __init__(self, model = None, seed = 0):
+        self.model = model or LinkModel()
+        self.rng = random.Random(seed)
+        self.servers = {}
+        self.nextPort = 49152
+
+    def link(self, model = None, reverse = None, names = (('sim', 0), ('sim', 1))):
+        """link: Creates a connected pair of stream endpoints
+
+        Args:
+            model (LinkModel, optional): Model for data sent from the first endpoint. Defaults to the network's model.
+            reverse (LinkModel, optional): Model for data sent from the second endpoint. Defaults to model.
+            names (tuple, optional): Socket names of the two endpoints.
+
+        Returns:
+            tuple: ((reader, writer), (reader, writer)) for the two ends of the link
+        """
+        loop = asyncio.get_running_loop()
+        model = model or self.model
+        reverse = reverse or model
+        ends = []
+        transports = (_LinkTransport(loop, model, self.rng, names[0]), _LinkTransport(loop, reverse, self.rng, names[1]))
+        transports[0].remote = transports[1]
+        transports[1].remote = transports[0]
+        for transport in transports:
+            reader = asyncio.StreamReader(loop=loop)
+            protocol = asyncio.StreamReaderProtocol(reader, loop=loop)
+            transport.protocol = protocol
+            protocol.connection_made(transport)
+            ends.append((reader, asyncio.StreamWriter(transport, protocol, reader, loop)))
+        return tuple(ends)
+
+    async def start_server(self, client_connected_cb, host, port, **kwargs):
+        """start_server: Listens for simulated connections, as asyncio.start_server
+
+        Args:
+            client_connected_cb (coroutine function): Called with (reader, writer) for each connection
+            host (str): Address to listen on
+            port (int): Port to listen on
+        """
+        self.servers[(host, port)] = client_connected_cb
+
+    async def open_connection(self, host, port, **kwargs):
+        """open_connection: Connects to a simulated server, as asyncio.open_connection
+
+        Args:
+            host (str): Server address
+            port (int): Server port
+
+        Raises:
+            ConnectionRefusedError: Nothing is listening on host:port
+
+        Returns:
+            tuple: (reader, writer)
+        """
+        callback = self.servers.get((host, port))
+        if callback is None:
+            raise ConnectionRefusedError('Nothing listening on %s:%s' % (host, port))
+        self.nextPort += 1
+        ((clientReader, clientWriter), (serverReader, serverWriter)) = self.link(names = (('127.0.0.1', self.nextPort), (host, port)))
+        asyncio.get_running_loop().create_task(callback(serverReader, serverWriter))
+        return clientReader, clientWriter
+
+def run(main, start = 0.0):
+    """run: Runs a coroutine on a new VirtualClockLoop, as asyncio.run
+
+    Args:
+        main (coroutine): The coroutine to run
+        start (float, optional): The initial value of the virtual clock in seconds. Defaults to 0.0.
+
+    Returns:
+        The result of the coroutine
+    """
+    loop = VirtualClockLoop(start)
+    try:
+        asyncio.set_event_loop(loop)
+        return loop.run_until_complete(main)
+    finally:
+        try:
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions = True))
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
@@ -0,0 +1,107 @@
+# pyBGBLink/stream.py
+#
+#Copyright 2020 @digital-pet
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+import asyncio
+from collections import deque
+
+class PacketStream:
+    """PacketStream: A batched, filtered view of the packets received by a peer.
+
+    Streams are created by Peer.packets() and fed once per read from the connection, so a consumer
+    sees a whole read's worth of traffic per await instead of one handler call per packet. Packets
+    are filtered on their command byte before anything is decoded.
+
+    Args:
+        packetClasses (dict): Mapping of command numbers to packet classes, used to decode packets.
+        types (iterable of int, optional): Command numbers to deliver. Defaults to None (all commands).
+        max_batch (int, optional): Maximum number of packets per batch. Defaults to 64.
+        raw (bool, optional): Deliver raw 8-byte memoryviews instead of decoded packets. Defaults to False.
+        max_pending (int, optional): Packets held before the stream reports itself full. Defaults to 4096.
+    """
+    def __init__(self, packetClasses, types = None, max_batch = 64, raw = False, max_pending = 4096):
+        self.packetClasses = packetClasses
+        self.maxBatch = max_batch
+        self.raw = raw
+        if types is None:
+            self.filter = [ptype in packetClasses for ptype in range(256)]
+        else:
+            types = {int(ptype) & 0xFF for ptype in types}
+            # undecodable commands can only be delivered raw
+            self.filter = [ptype in types and (raw or ptype in packetClasses) for ptype in range(256)]
+        self.maxPending = max_pending
+        self.pending = deque()
+        self.ready = asyncio.Event()
+        self.space = asyncio.Event()
+        self.space.set()
+        self.closed = False
+
+    def _feed(self, buffer, end):
+        """_feed: Queues the matching packets from a single read
+
+        Args:
+            buffer (memoryview): The bytes received by a single read
+            end (int): Length of the complete packets at the start of buffer
+        """
+        if self.closed:
+            return
+        pending = self.pending
+        packetFilter = self.filter
+        for offset in range(0, end, 8):
+            ptype = buffer[offset]
+            if packetFilter[ptype]:
+                view = buffer[offset:offset + 8]
+                if self.raw:
+                    pending.append(view)
+                else:
+                    pending.append(self.packetClasses[ptype](view))
+        if pending:
+            self.ready.set()
+            if len(pending) >= self.maxPending:
+                self.space.clear()
+
+    def full(self):
+        """full: Checks whether the stream holds max_pending packets or more
+
+        Returns:
+            bool: True if the read loop should wait for the consumer
+        """
+        return not self.space.is_set()
+
+    def _close(self):
+        """_close: Ends the stream once any pending packets have been consumed
+        """
+        self.closed = True
+        self.ready.set()
+        self.space.set()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self.pending:
+            if self.closed:
+                raise StopAsyncIteration
+            self.ready.clear()
+            await self.ready.wait()
+        pending = self.pending
+        if len(pending) <= self.maxBatch:
+            batch = list(pending)
+            pending.clear()
+        else:
+            batch = [pending.popleft() for _ in range(self.maxBatch)]
+        if len(pending) < self.maxPending:
+            self.space.set()
+        return batch
@@ -0,0 +1,161 @@
+# pyBGBLink/trace.py
+#
+#Copyright 2020 @digital-pet
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+import logging
+from array import array
+from time import monotonic_ns
+
+class PacketTracer:
+    """PacketTracer: A fixed-size ring buffer of packet events.
+
+    All storage is allocated up front, recording an event only overwrites the oldest slot. Tracing
+    is on by default: peers record into the module level tracer instance whenever it is enabled, and
+    it is dumped on demand, on connection and protocol errors and optionally on every disconnect.
+    Events are always 8 bytes, longer payloads are truncated and shorter ones padded with zeros.
+
+    Args:
+        size (int, optional): Number of events held before the oldest are overwritten. Defaults to 4096.
+    """
+    IN = 0
+    OUT = 1
+
+    def __init__(self, size = 4096):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.size = size
+        self.peers = array('l', [0]) * size
+        self.directions = bytearray(size)
+        self.data = bytearray(size * 8)
+        self.timestamps = array('q', [0]) * size
+        self.index = 0              # next slot to be written
+        self.count = 0              # total events recorded
+        self.tick = 0               # total events seen, including those skipped by sampling
+        self.enabled = True
+        self.sampleEvery = 1        # record one in every sampleEvery events
+        self.dumpOnError = True
+        self.dumpOnDisconnect = False
+
+    def record(self, peer, direction, raw_packet):
+        """record: Records a single packet event
+
+        Args:
+            peer (int or None): The ID of the peer the packet belongs to
+            direction (int): PacketTracer.IN or PacketTracer.OUT
+            raw_packet (Bytes): A raw BGBLink protocol packet
+        """
+        self.tick += 1
+        if self.tick % self.sampleEvery:
+            return
+        i = self.index
+        self.peers[i] = -1 if peer is None else peer
+        self.directions[i] = direction
+        if len(raw_packet) != 8:
+            # a slice assignment of any other length would resize the ring
+            raw_packet = bytes(raw_packet[:8]).ljust(8, b'\0')
+        self.data[i * 8:i * 8 + 8] = raw_packet
+        self.timestamps[i] = monotonic_ns()
+        self.index = (i + 1) % self.size
+        self.count += 1
+
+    def record_batch(self, peer, direction, buffer, end):
+        """record_batch: Records every whole packet from a single read
+
+        Args:
+            peer (int or None): The ID of the peer the packets belong to
+            direction (int): PacketTracer.IN or PacketTracer.OUT
+            buffer (memoryview): The bytes received by a single read
+            end (int): Length of the complete packets at the start of buffer
+        """
+        peer = -1 if peer is None else peer
+        now = monotonic_ns()
+        peers = self.peers
+        directions = self.directions
+        timestamps = self.timestamps
+        if self.sampleEvery == 1:
+            # unsampled reads copy their bytes into the ring in at most two contiguous blocks
+            offset = 0
+            total = end // 8
+            while offset < total:
+                i = self.index
+                n = min(total - offset, self.size - i)
+                self.data[i * 8:(i + n) * 8] = buffer[offset * 8:(offset + n) * 8]
+                for j in range(i, i + n):
+                    peers[j] = peer
+                    directions[j] = direction
+                    timestamps[j] = now
+                self.index = (i + n) % self.size
+                offset += n
+            self.tick += total
+            self.count += total
+            return
+        # sampled reads only visit the packets that are recorded, the first is the next multiple of sampleEvery
+        sampleEvery = self.sampleEvery
+        size = self.size
+        data = self.data
+        i = self.index
+        first = (sampleEvery - 1 - self.tick % sampleEvery) * 8
+        for offset in range(first, end, sampleEvery * 8):
+            peers[i] = peer
+            directions[i] = direction
+            data[i * 8:i * 8 + 8] = buffer[offset:offset + 8]
+            timestamps[i] = now
+            i = (i + 1) % size
+            self.count += 1
+        self.tick += end // 8
+        self.index = i
+
+    def dump(self, peer = None):
+        """dump: Returns the recorded events, oldest first
+
+        Args:
+            peer (int or None, optional): Only return events for this peer ID. Defaults to None (all peers).
+
+        Returns:
+            list: Tuples of (peer, direction, command, raw_packet, timestamp_ns)
+        """
+        held = min(self.count, self.size)
+        start = (self.index - held) % self.size
+        events = []
+        for n in range(held):
+            i = (start + n) % self.size
+            eventPeer = self.peers[i]
+            if eventPeer == -1:
+                eventPeer = None
+            if peer is not None and eventPeer != peer:
+                continue
+            raw_packet = bytes(self.data[i * 8:i * 8 + 8])
+            events.append((eventPeer, self.directions[i], raw_packet[0], raw_packet, self.timestamps[i]))
+        return events
+
+    def log(self, peer = None, level = logging.INFO):
+        """log: Writes the recorded events to the log
+
+        Args:
+            peer (int or None, optional): Only log events for this peer ID. Defaults to None (all peers).
+            level (int, optional): Logging level to use. Defaults to logging.INFO.
+        """
+        events = self.dump(peer)
+        self.logger.log(level, 'Dumping %s traced packet events.', len(events))
+        for (eventPeer, direction, command, raw_packet, timestamp) in events:
+            self.logger.log(level, '%d peer %s %s command 0x%02X: %s', timestamp, eventPeer, 'in ' if direction == self.IN else 'out', command, raw_packet.hex())
+
+    def clear(self):
+        """clear: Discards all recorded events
+        """
+        self.index = 0
+        self.count = 0
+        self.tick = 0
+
+tracer = PacketTracer()
@@ -0,0 +1,156 @@
+import asyncio
+import multiprocessing
+from struct import pack
+
+import pyBGBLink
+from pyBGBLink.bridge import Bridge, open_bridge, start_bridge_server
+from pyBGBLink.peers import ProxyPeer
+from pyBGBLink.simulation import SimulatedNetwork, run
+
+SYNC1 = pack('=bbbbi', 0x68, 0x12, -127, 0, 0)
+SYNC2 = pack('=bbbbi', 0x69, 0x12, -128, 0, 0)
+RUNNING = pack('=bbbbi', 0x6C, int(pyBGBLink.defines.S_ISRUNNING), 0, 0, 0)
+S_ISPAUSED = int(pyBGBLink.defines.S_ISPAUSED)
+CHANNEL = 3
+
+async def start_peer(peerClass = ProxyPeer):
+    ((reader, writer), (emulatorReader, emulatorWriter)) = SimulatedNetwork().link()
+    peer = peerClass(reader, writer, 0)
+    asyncio.create_task(peer._read_loop())
+    asyncio.create_task(peer._write_loop())
+    return peer, emulatorReader, emulatorWriter
+
+async def echo_emulator(reader, writer):
+    try:
+        while True:
+            raw_packet = await reader.readexactly(8)
+            if raw_packet[0] == 0x68:
+                writer.write(SYNC2)
+    except asyncio.IncompleteReadError:
+        pass
+
+def serve(path):
+    async def main():
+        done = asyncio.get_running_loop().create_future()
+        async def on_bridge(bridge):
+            (peer, reader, writer) = await start_peer()
+            asyncio.create_task(echo_emulator(reader, writer))
+            # attach late, everything the other process sent so far must be held until now
+            await asyncio.sleep(0.3)
+            await bridge.attach(peer, CHANNEL)
+            await asyncio.sleep(1)
+            done.set_result(None)
+        await start_bridge_server(on_bridge, path)
+        await asyncio.wait_for(done, 10)
+    asyncio.run(main())
+
+def test_bridge_between_processes(tmp_path):
+    path = str(tmp_path / 'bridge.sock')
+    process = multiprocessing.get_context('fork').Process(target=serve, args=(path,))
+    process.start()
+    async def main():
+        # the socket file appears just before the other process starts listening on it
+        while True:
+            try:
+                bridge = await open_bridge(path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                await asyncio.sleep(0.01)
+        (peer, reader, writer) = await start_peer()
+        remote = await bridge.attach(peer, CHANNEL)
+        writer.write(SYNC1)
+        received = []
+        while not received or received[-1] != SYNC2:
+            received.append(await asyncio.wait_for(reader.readexactly(8), 5))
+        # the other process answers the syncs its peer sends and reports the round trip
+        peer.send_packet(SYNC1)
+        await asyncio.sleep(0.2)
+        return received, remote.remoteLatencyTime, remote.get_backlog()
+    try:
+        (received, latencyTime, backlog) = asyncio.run(main())
+    finally:
+        process.join(5)
+        if process.is_alive():
+            process.kill()
+    assert received[0][0] == 0x01
+    assert any(raw_packet[0] == 0x6C for raw_packet in received)
+    assert received[-1] == SYNC2
+    assert latencyTime is not None
+    assert backlog == 0
+    assert process.exitcode == 0
+
+class HeldPeer(ProxyPeer):
+    def __init__(self, reader, writer, PeerID):
+        super().__init__(reader, writer, PeerID)
+        self.throttled = True
+
+    def _check_flow(self):
+        pass
+
+def test_bridged_status_keeps_throttled_peer_paused():
+    async def main():
+        ((reader, writer), (remoteReader, remoteWriter)) = SimulatedNetwork().link()
+        (bridge, remoteBridge) = (Bridge(reader, writer), Bridge(remoteReader, remoteWriter))
+        bridge.start()
+        remoteBridge.start()
+        (running, runningReader, runningWriter) = await start_peer()
+        (held, heldReader, heldWriter) = await start_peer(HeldPeer)
+        await bridge.attach(running, CHANNEL)
+        await remoteBridge.attach(held, CHANNEL)
+        runningWriter.write(RUNNING)
+        statuses = []
+        while len(statuses) < 2:
+            raw_packet = await heldReader.readexactly(8)
+            if raw_packet[0] == 0x6C:
+                statuses.append(raw_packet[1])
+        return statuses
+    statuses = run(main())
+    assert all(status & S_ISPAUSED for status in statuses)
+
+async def start_bridges():
+    ((reader, writer), (remoteReader, remoteWriter)) = SimulatedNetwork().link()
+    bridges = (Bridge(reader, writer), Bridge(remoteReader, remoteWriter))
+    for bridge in bridges:
+        bridge.start()
+    return bridges
+
+def test_channel_reused_after_both_sides_hang_up():
+    async def main():
+        bridges = await start_bridges()
+        old = [await start_peer() for _ in bridges]
+        for (bridge, (peer, reader, writer)) in zip(bridges, old):
+            await bridge.attach(peer, CHANNEL)
+        await asyncio.sleep(0.2)
+        # both emulators hang up at the same moment
+        for (peer, reader, writer) in old:
+            writer.close()
+        await asyncio.sleep(0.5)
+        new = [await start_peer() for _ in bridges]
+        remotes = [await bridge.attach(peer, CHANNEL) for (bridge, (peer, reader, writer)) in zip(bridges, new)]
+        asyncio.create_task(echo_emulator(new[1][1], new[1][2]))
+        await asyncio.sleep(0.5)
+        new[0][2].write(SYNC1)
+        received = []
+        while not received or received[-1] != SYNC2:
+            received.append(await asyncio.wait_for(new[0][1].readexactly(8), 5))
+        return ([remote.closed for remote in remotes], [peer.peer is not None for (peer, reader, writer) in new],
+                [(bridge.early, bridge.earlyState, bridge.closing) for bridge in bridges])
+    (closed, connected, held) = run(main())
+    assert closed == [False, False]
+    assert connected == [True, True]
+    assert held == [({}, {}, {}), ({}, {}, {})]
+
+def test_unattached_channels_are_bounded():
+    async def main():
+        (bridge, remoteBridge) = await start_bridges()
+        bridge.maxEarlyChannels = 2
+        peers = [await start_peer() for _ in range(4)]
+        for (channel, (peer, reader, writer)) in enumerate(peers):
+            await remoteBridge.attach(peer, channel)
+        # several seconds of state reports for channels never attached on this side
+        await asyncio.sleep(2)
+        return bridge.early, bridge.earlyState
+    (early, earlyState) = run(main())
+    assert set(early) | set(earlyState) == {0, 1}
+    assert list(earlyState) == [0, 1]
+    assert all(held <= Bridge.maxEarlyPackets for (held, frames) in early.values())
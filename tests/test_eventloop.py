@@ -0,0 +1,53 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from pyBGBLink import eventloop
+
+@pytest.fixture
+def no_uvloop(monkeypatch):
+    monkeypatch.setattr(eventloop, 'uvloop', None)
+
+@pytest.fixture
+def fake_uvloop(monkeypatch):
+    fake = SimpleNamespace(new_event_loop=asyncio.new_event_loop)
+    monkeypatch.setattr(eventloop, 'uvloop', fake)
+    return fake
+
+def test_auto_prefers_uvloop(fake_uvloop, monkeypatch):
+    monkeypatch.delenv('BGBLINK_LOOP', raising=False)
+    assert eventloop.loop_name() == 'uvloop'
+    assert eventloop.loop_name('auto') == 'uvloop'
+    assert eventloop.loop_factory() is fake_uvloop.new_event_loop
+
+def test_auto_falls_back_to_asyncio(no_uvloop, monkeypatch):
+    monkeypatch.delenv('BGBLINK_LOOP', raising=False)
+    assert eventloop.loop_name() == 'asyncio'
+    assert eventloop.loop_factory() is asyncio.new_event_loop
+
+@pytest.mark.parametrize('value, expected', [('auto', 'uvloop'), ('asyncio', 'asyncio'), ('uvloop', 'uvloop')])
+def test_environment_selects_loop(fake_uvloop, monkeypatch, value, expected):
+    monkeypatch.setenv('BGBLINK_LOOP', value)
+    assert eventloop.loop_name() == expected
+    # an explicit name wins over the environment
+    assert eventloop.loop_name('asyncio') == 'asyncio'
+
+def test_unknown_loop_is_rejected(monkeypatch):
+    monkeypatch.setenv('BGBLINK_LOOP', 'trio')
+    with pytest.raises(ValueError):
+        eventloop.loop_name()
+    with pytest.raises(ValueError):
+        eventloop.loop_name('trio')
+
+def test_uvloop_requested_but_missing(no_uvloop, monkeypatch):
+    monkeypatch.setenv('BGBLINK_LOOP', 'uvloop')
+    with pytest.raises(ImportError):
+        eventloop.loop_name()
+    with pytest.raises(ImportError):
+        eventloop.run(asyncio.sleep(0))
+
+def test_run_leaves_the_loop_policy_alone(no_uvloop):
+    policy = asyncio.get_event_loop_policy()
+    assert eventloop.run(asyncio.sleep(0, 'done'), 'asyncio') == 'done'
+    assert asyncio.get_event_loop_policy() is policy
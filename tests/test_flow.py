@@ -0,0 +1,126 @@
+import asyncio
+from struct import pack
+
+import pyBGBLink
+from pyBGBLink.peers import ProxyPeer
+from pyBGBLink.simulation import LinkModel, SimulatedNetwork, run
+
+SYNC1 = pack('=bbbbi', 0x68, 0x12, -127, 0, 0)
+SYNC2 = pack('=bbbbi', 0x69, 0x12, -128, 0, 0)
+S_ISPAUSED = int(pyBGBLink.defines.S_ISPAUSED)
+
+async def start_peer(network, model = None):
+    ((reader, writer), (emulatorReader, emulatorWriter)) = network.link(model)
+    peer = ProxyPeer(reader, writer, 0)
+    asyncio.create_task(peer._read_loop())
+    asyncio.create_task(peer._write_loop())
+    return peer, emulatorReader, emulatorWriter
+
+async def fast_emulator(reader, writer, statuses, duration, interval = 0.01):
+    # like a real serial port, a new transfer only starts once the last one is answered or given up on
+    loop = asyncio.get_running_loop()
+    answered = asyncio.Event()
+    async def read():
+        while True:
+            raw_packet = await reader.readexactly(8)
+            if raw_packet[0] == 0x6C:
+                statuses.append(raw_packet[1])
+            elif raw_packet[0] == 0x69:
+                answered.set()
+    reading = asyncio.create_task(read())
+    end = loop.time() + duration
+    while loop.time() < end:
+        # a paused emulator stops sending syncs
+        if not (statuses and statuses[-1] & S_ISPAUSED):
+            answered.clear()
+            writer.write(SYNC1)
+            try:
+                await asyncio.wait_for(answered.wait(), 1)
+            except asyncio.TimeoutError:
+                pass
+        await asyncio.sleep(interval)
+    return reading
+
+async def echo_emulator(reader, writer, ignore = 0):
+    try:
+        while True:
+            raw_packet = await reader.readexactly(8)
+            if raw_packet[0] == 0x68:
+                if ignore:
+                    ignore -= 1
+                    continue
+                writer.write(SYNC2)
+    except asyncio.IncompleteReadError:
+        pass
+
+def test_slow_partner_link_throttles_fast_emulator():
+    async def main():
+        network = SimulatedNetwork(seed=1)
+        (fast, fastReader, fastWriter) = await start_peer(network)
+        (slow, slowReader, slowWriter) = await start_peer(network, LinkModel(latency=0.5, jitter=0.3))
+        await fast.connect(slow)
+        await slow.connect(fast)
+        statuses = []
+        asyncio.create_task(echo_emulator(slowReader, slowWriter))
+        reading = await fast_emulator(fastReader, fastWriter, statuses, 5)
+        throttledDuring = fast.get_throttled_time()
+        sawPause = any(status & S_ISPAUSED for status in statuses)
+        # the slow side goes away while the fast side is held, it must be released
+        slowWriter.close()
+        await asyncio.sleep(1)
+        reading.cancel()
+        return throttledDuring, sawPause, statuses[-1], fast.throttled
+    (throttledDuring, sawPause, lastStatus, stillThrottled) = run(main())
+    assert throttledDuring > 1
+    assert sawPause
+    assert not lastStatus & S_ISPAUSED
+    assert not stillThrottled
+
+def test_fast_partner_link_is_not_throttled():
+    async def main():
+        network = SimulatedNetwork(LinkModel(latency=0.001), seed=1)
+        (a, aReader, aWriter) = await start_peer(network)
+        (b, bReader, bWriter) = await start_peer(network)
+        await a.connect(b)
+        await b.connect(a)
+        statuses = []
+        asyncio.create_task(echo_emulator(bReader, bWriter))
+        reading = await fast_emulator(aReader, aWriter, statuses, 2)
+        reading.cancel()
+        return a.get_throttled_time(), b.linkLatency
+    (throttled, latency) = run(main())
+    assert throttled == 0
+    assert 0 < latency < 0.01
+
+def test_unanswered_sync_does_not_skew_latency():
+    async def main():
+        network = SimulatedNetwork(LinkModel(latency=0.001), seed=1)
+        (a, aReader, aWriter) = await start_peer(network)
+        (b, bReader, bWriter) = await start_peer(network)
+        await a.connect(b)
+        await b.connect(a)
+        statuses = []
+        asyncio.create_task(echo_emulator(bReader, bWriter, ignore=1))
+        reading = await fast_emulator(aReader, aWriter, statuses, 10, interval=0.1)
+        reading.cancel()
+        return a.get_throttled_time(), b.linkLatency, b.get_sync_wait()
+    (throttled, latency, wait) = run(main())
+    assert throttled == 0
+    assert 0 < latency < 0.01
+    assert wait == 0
+
+def test_disconnected_peer_stops_watching_partner():
+    async def main():
+        network = SimulatedNetwork(LinkModel(latency=0.001), seed=1)
+        (a, aReader, aWriter) = await start_peer(network)
+        (b, bReader, bWriter) = await start_peer(network)
+        await a.connect(b)
+        await b.connect(a)
+        aWriter.close()
+        await asyncio.sleep(0.5)
+        return a.active, a.peer, b.peer, b.active
+    (aActive, aPartner, bPartner, bActive) = run(main())
+    assert not aActive
+    assert aPartner is None
+    assert bPartner is None
+    assert bActive
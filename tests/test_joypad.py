@@ -0,0 +1,44 @@
+import asyncio
+
+import pyBGBLink
+from pyBGBLink.joypad import PRESS, RELEASE, JoypadState, button_mask, set_states
+
+class Sink:
+    def __init__(self):
+        self.sent = []
+
+    def send_packet(self, raw_packet):
+        self.sent.append(raw_packet)
+
+def test_transition_tables_match_joypad_packets():
+    for button in range(8):
+        for (table, isPressed) in ((PRESS, True), (RELEASE, False)):
+            packet = pyBGBLink.JoypadPacket(table[button])
+            assert len(table[button]) == 8
+            assert packet.b0 == pyBGBLink.defines.C_JOYPAD
+            assert packet.button == button
+            assert packet.isPressed == isPressed
+
+def test_set_state_only_sends_changes():
+    sink = Sink()
+    joypad = JoypadState(sink)
+    assert joypad.press(pyBGBLink.defines.B_A) == 1
+    assert joypad.press(pyBGBLink.defines.B_A) == 0
+    assert joypad.set_state(button_mask(pyBGBLink.defines.B_A, pyBGBLink.defines.B_B)) == 1
+    assert joypad.release(pyBGBLink.defines.B_A, pyBGBLink.defines.B_START) == 1
+    assert sink.sent == [PRESS[4], PRESS[5], RELEASE[4]]
+    assert joypad.state == button_mask(pyBGBLink.defines.B_B)
+
+def test_tap_presses_then_releases():
+    sink = Sink()
+    joypad = JoypadState(sink)
+    asyncio.run(joypad.tap(pyBGBLink.defines.B_DOWN, duration=0))
+    assert sink.sent == [PRESS[3], RELEASE[3]]
+    assert joypad.state == 0
+
+def test_set_states_updates_every_tracker():
+    sinks = [Sink() for _ in range(3)]
+    joypads = [JoypadState(sink) for sink in sinks]
+    joypads[0].press(pyBGBLink.defines.B_A)
+    assert set_states(joypads, button_mask(pyBGBLink.defines.B_A)) == 2
+    assert all(sink.sent == [PRESS[4]] for sink in sinks)
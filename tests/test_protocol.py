@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import random
+from struct import pack
+
+from pyBGBLink.peers import ProxyPeer
+from pyBGBLink.protocol import BGBProtocol
+from pyBGBLink.simulation import SimulatedNetwork, run
+
+# version packets are left out, a wrong version is a deliberate disconnect
+VALID = (0x65, 0x68, 0x69, 0x6A, 0x6C, 0x6D)
+
+def random_packets(count, seed = 0):
+    """Random packets, half of them with a valid command so the handlers are exercised too."""
+    rng = random.Random(seed)
+    data = bytearray(rng.randbytes(count * 8))
+    for offset in range(0, len(data), 8):
+        if offset % 16 == 0 or data[offset] == 0x01:
+            data[offset] = rng.choice(VALID)
+    return bytes(data)
+
+def test_sync_packets_round_trip():
+    for raw_packet in (pack('=bbbbi', 0x68, 0x12, -127, 0, 123456), pack('=bbbbi', 0x69, 0x12, -128, 0, 0)):
+        packet = BGBProtocol().packetClasses[raw_packet[0]](raw_packet)
+        assert packet.assemble() == raw_packet
+
+def test_unknown_commands_follow_policy():
+    class Partner:
+        def __init__(self):
+            self.sent = []
+        def send_packet(self, raw_packet):
+            self.sent.append(raw_packet)
+
+    async def main():
+        ((reader, writer), _) = SimulatedNetwork().link()
+        peer = ProxyPeer(reader, writer, 0)
+        peer.peer = Partner()
+        peer.unknownPolicies[0x70] = peer.PASSTHROUGH
+        peer.unknownPolicies[0x71] = peer.DISCONNECT
+        peer._on_packet_received(bytes((0x7F,)) + bytes(7))
+        peer._on_packet_received(bytes((0x70, 1)) + bytes(6))
+        assert peer.active
+        peer._on_packet_received(bytes((0x71,)) + bytes(7))
+        return peer
+    peer = run(main())
+    assert peer.peer.sent == [bytes((0x70, 1)) + bytes(6)]
+    assert peer.errors == {0x7F: 1, 0x70: 1, 0x71: 1}
+    assert not peer.active
+
+def test_fuzz_proxied_pair_survives_random_packets():
+    count = 20000
+
+    async def main():
+        network = SimulatedNetwork()
+        peers = []
+        emulators = []
+        for i in range(2):
+            ((reader, writer), emulator) = network.link()
+            peer = ProxyPeer(reader, writer, i)
+            peer.rtask = asyncio.create_task(peer._read_loop())
+            asyncio.create_task(peer._write_loop())
+            peers.append(peer)
+            emulators.append(emulator)
+        await peers[0].connect(peers[1])
+        await peers[1].connect(peers[0])
+        # keep the receiving emulator's buffer drained
+        asyncio.create_task(emulators[1][0].read(-1))
+        emulators[0][1].write(random_packets(count))
+        # wait for the whole burst to be dispatched, bursts are read 512 packets at a time
+        await asyncio.sleep(1)
+        return [peer.active and not peer.rtask.done() for peer in peers], peers[0].errors
+    (alive, errors) = run(main())
+    assert alive == [True, True]
+    # the handlers cope with every valid command, only unknown commands are counted
+    assert all(isinstance(ptype, int) for ptype in errors)
+    # every random unknown command was counted
+    assert sum(errors.values()) >= count // 2 * 240 // 256 * 9 // 10
+
+def test_handler_failures_are_logged_and_counted_apart(caplog):
+    class BrokenProxyPeer(ProxyPeer):
+        def _on_joypad(self, packet):
+            raise ValueError('bug in a subclass handler')
+
+    async def main():
+        ((reader, writer), (remoteReader, remoteWriter)) = SimulatedNetwork().link()
+        peer = BrokenProxyPeer(reader, writer, 0)
+        remoteWriter.write(pack('=BBBBi', 0x65, 0x03, 0, 0, 0) + pack('=BBBBi', 0x7F, 0, 0, 0, 0))
+        remoteWriter.close()
+        await peer._read_loop()
+        return peer.errors
+    with caplog.at_level(logging.ERROR, logger='BrokenProxyPeer'):
+        errors = run(main())
+    assert errors == {(0x65, 'handler'): 1, 0x7F: 1}
+    assert 'bug in a subclass handler' in caplog.text
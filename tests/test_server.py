@@ -0,0 +1,83 @@
+import asyncio
+
+import pyBGBLink
+from pyBGBLink.peers import Peer
+from pyBGBLink.simulation import LinkModel, SimulatedNetwork, run
+
+VERSION = pyBGBLink.VersionPacket().assemble()
+JOYPAD = bytes((0x65, 0x03, 0, 0, 0, 0, 0, 0))
+
+class CountingPeer(Peer):
+    dispatched = 0
+
+    def _on_joypad(self, packet):
+        super()._on_joypad(packet)
+        CountingPeer.dispatched += 1
+
+async def flooder(network, port):
+    while True:
+        (reader, writer) = await network.open_connection('server', port)
+        try:
+            writer.write(JOYPAD * 100)
+            await asyncio.sleep(0.05)
+        finally:
+            writer.close()
+
+def flood(**limits):
+    async def main():
+        CountingPeer.dispatched = 0
+        network = SimulatedNetwork(LinkModel(latency=0.001))
+        server = pyBGBLink.Server('server', 8765, peerClass=CountingPeer, network=network, **limits)
+        await server.start()
+        (reader, writer) = await network.open_connection('server', 8765)
+        await reader.readexactly(8)
+        flooders = [asyncio.create_task(flooder(network, 8765)) for _ in range(50)]
+        await asyncio.sleep(1)
+        # the client connected before the flood is still served
+        writer.write(VERSION)
+        reply = await asyncio.wait_for(reader.readexactly(8), 1)
+        for task in flooders:
+            task.cancel()
+        await asyncio.sleep(0.5)
+        return reply[0], CountingPeer.dispatched, server.get_stats(), server.peerCount, dict(server.ipCounts)
+    return run(main())
+
+def test_flood_is_limited():
+    (unlimitedReply, unlimited, unlimitedStats, peerCount, ipCounts) = flood()
+    (reply, dispatched, stats, peerCount, ipCounts) = flood(maxPeersPerIP=5, connectRate=5, packetRate=500, packetBurst=50)
+    assert unlimitedReply == reply == 0x6C
+    assert sum(unlimitedStats['rejected'].values()) == 0
+    assert stats['rejected']['maxPeersPerIP'] > 0
+    assert stats['rejected']['connectRate'] > 0
+    assert stats['throttledReads'] > 0
+    # the limits keep most of the flood from ever reaching the handlers
+    assert dispatched * 10 < unlimited
+    # only the original client is left once the flood stops
+    assert peerCount == 1
+    assert ipCounts == {'127.0.0.1' : 1}
+
+def test_flood_is_limited_by_max_peers():
+    (reply, dispatched, stats, peerCount, ipCounts) = flood(maxPeers=5)
+    assert reply == 0x6C
+    assert stats['rejected']['maxPeers'] > 0
+    assert stats['rejected']['maxPeersPerIP'] == stats['rejected']['connectRate'] == 0
+    assert peerCount == 1
+    assert ipCounts == {'127.0.0.1' : 1}
+
+class BrokenPeer(Peer):
+    def __init__(self, reader, writer, PeerID):
+        raise RuntimeError('broken peer class')
+
+def test_counts_released_when_peer_class_fails():
+    async def main():
+        network = SimulatedNetwork()
+        server = pyBGBLink.Server('server', 8765, peerClass=BrokenPeer, maxPeers=1, network=network)
+        await server.start()
+        for _ in range(3):
+            await network.open_connection('server', 8765)
+            await asyncio.sleep(0.1)
+        return server.peerCount, dict(server.ipCounts), server.rejected['maxPeers']
+    (peerCount, ipCounts, rejected) = run(main())
+    assert peerCount == 0
+    assert ipCounts == {}
+    assert rejected == 0
@@ -0,0 +1,24 @@
+import asyncio
+
+from pyBGBLink.simulation import LinkModel, SimulatedNetwork, run
+
+def test_virtual_clock_skips_waiting():
+    async def main():
+        await asyncio.sleep(3600)
+        return asyncio.get_running_loop().time()
+    assert run(main()) == 3600
+
+def test_link_delivers_in_order_before_close():
+    async def main():
+        network = SimulatedNetwork(LinkModel(latency=0.05, jitter=0.05, loss=0.2), seed=3)
+        ((reader, writer), (remoteReader, remoteWriter)) = network.link()
+        for i in range(200):
+            writer.write(bytes((i,)))
+        writer.close()
+        data = await remoteReader.read()
+        return data, asyncio.get_running_loop().time()
+    (data, elapsed) = run(main())
+    assert data == bytes(range(200))
+    assert elapsed >= 0.05
+    # runs are repeatable for a given seed
+    assert run(main()) == (data, elapsed)
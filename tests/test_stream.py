@@ -0,0 +1,92 @@
+import asyncio
+
+import pyBGBLink
+from pyBGBLink.peers import Peer
+from pyBGBLink.simulation import SimulatedNetwork, run
+
+JOYPAD = bytes((0x65, 0x03, 0, 0, 0, 0, 0, 0))
+SYNC3 = bytes((0x6A, 0, 0, 0, 0, 0, 0, 0))
+
+class CountingPeer(Peer):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.joypads = 0
+
+    def _on_joypad(self, packet):
+        super()._on_joypad(packet)
+        self.joypads += 1
+
+async def linked_peer(peerClass = CountingPeer):
+    ((reader, writer), (remoteReader, remoteWriter)) = SimulatedNetwork().link()
+    peer = peerClass(reader, writer, 0)
+    rtask = asyncio.create_task(peer._read_loop())
+    wtask = asyncio.create_task(peer._write_loop())
+    return peer, rtask, wtask, remoteReader, remoteWriter
+
+def test_batches_are_filtered_and_bounded():
+    async def main():
+        (peer, rtask, wtask, remoteReader, remoteWriter) = await linked_peer()
+        remoteWriter.write((JOYPAD + SYNC3) * 10)
+        remoteWriter.close()
+        batches = [batch async for batch in peer.packets(types=[pyBGBLink.defines.C_JOYPAD], max_batch=4)]
+        wtask.cancel()
+        return peer, batches
+    (peer, batches) = run(main())
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    assert all(packet.button == 3 for batch in batches for packet in batch)
+    assert peer.joypads == 10
+
+def test_exclusive_stream_skips_handlers():
+    async def main():
+        (peer, rtask, wtask, remoteReader, remoteWriter) = await linked_peer()
+        stream = peer.packets(types=[pyBGBLink.defines.C_JOYPAD], raw=True, exclusive=True)
+        first = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        remoteWriter.write(JOYPAD * 5)
+        batch = await first
+        await stream.aclose()
+        remoteWriter.write(JOYPAD)
+        await asyncio.sleep(0.1)
+        wtask.cancel()
+        return peer, batch
+    (peer, batch) = run(main())
+    assert [bytes(view) for view in batch] == [JOYPAD] * 5
+    # only the packet sent after the stream was closed reached the handler
+    assert peer.joypads == 1
+
+def test_full_stream_pauses_reading():
+    async def main():
+        (peer, rtask, wtask, remoteReader, remoteWriter) = await linked_peer()
+        stream = peer.packets(raw=True, max_pending=8)
+        first = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        remoteWriter.write(JOYPAD * 8)
+        await first
+        # nobody is consuming now, the stream fills and the read loop stops
+        remoteWriter.write(JOYPAD * 8)
+        await asyncio.sleep(0.1)
+        remoteWriter.write(JOYPAD * 8)
+        await asyncio.sleep(0.1)
+        paused = peer.joypads
+        batch = await stream.__anext__()
+        await asyncio.sleep(0.1)
+        resumed = peer.joypads
+        await stream.aclose()
+        wtask.cancel()
+        return paused, len(batch), resumed
+    assert run(main()) == (16, 8, 24)
+
+def test_streams_end_when_read_loop_dies():
+    async def main():
+        (peer, rtask, wtask, remoteReader, remoteWriter) = await linked_peer()
+        async def consume():
+            return [batch async for batch in peer.packets()]
+        consumer = asyncio.create_task(consume())
+        await asyncio.sleep(0.1)
+        rtask.cancel()
+        batches = await asyncio.wait_for(consumer, 10)
+        wtask.cancel()
+        return peer, batches
+    (peer, batches) = run(main())
+    assert batches == []
+    assert not peer.active
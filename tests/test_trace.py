@@ -0,0 +1,65 @@
+import logging
+from struct import pack
+
+from pyBGBLink.peers import Peer
+from pyBGBLink.protocol import BGBProtocol
+from pyBGBLink.simulation import SimulatedNetwork, run
+from pyBGBLink.trace import PacketTracer, tracer
+
+def packet(n):
+    return pack('=BBBBi', 0x65, n & 0xFF, 0, 0, n)
+
+def test_ring_wraps_around():
+    ring = PacketTracer(4)
+    for n in range(10):
+        ring.record(n % 2, ring.IN, packet(n))
+    events = ring.dump()
+    assert [raw_packet for (peer, direction, command, raw_packet, timestamp) in events] == [packet(n) for n in range(6, 10)]
+    assert ring.count == 10
+    assert len(ring.data) == 32
+
+def test_batch_wraps_around():
+    ring = PacketTracer(4)
+    ring.record(None, ring.OUT, packet(0))
+    data = b''.join(packet(n) for n in range(1, 6))
+    ring.record_batch(7, ring.IN, memoryview(data), len(data))
+    events = ring.dump()
+    assert [raw_packet for (peer, direction, command, raw_packet, timestamp) in events] == [packet(n) for n in range(2, 6)]
+    assert all(peer == 7 and direction == ring.IN for (peer, direction, command, raw_packet, timestamp) in events)
+
+def test_sampling_records_one_in_n():
+    ring = PacketTracer(16)
+    ring.sampleEvery = 3
+    for n in range(6):
+        ring.record(1, ring.IN, packet(n))
+    data = b''.join(packet(n) for n in range(6, 12))
+    ring.record_batch(1, ring.IN, memoryview(data), len(data))
+    assert [raw_packet for (peer, direction, command, raw_packet, timestamp) in ring.dump()] == [packet(n) for n in (2, 5, 8, 11)]
+    assert ring.tick == 12
+
+def test_dump_filters_by_peer():
+    ring = PacketTracer(8)
+    for n in range(6):
+        ring.record(None if n == 5 else n % 2, ring.IN, packet(n))
+    assert [raw_packet for (peer, direction, command, raw_packet, timestamp) in ring.dump(peer=1)] == [packet(1), packet(3)]
+    assert ring.dump()[-1][0] is None
+
+def test_odd_sized_payloads_keep_the_ring_intact():
+    ring = PacketTracer(4)
+    ring.record(0, ring.OUT, b'\x6c\x01')
+    ring.record(0, ring.OUT, packet(1) + b'extra')
+    ring.record(0, ring.OUT, packet(2))
+    assert len(ring.data) == 32
+    assert [raw_packet for (peer, direction, command, raw_packet, timestamp) in ring.dump()] == [b'\x6c\x01' + bytes(6), packet(1), packet(2)]
+
+def test_disconnect_policy_dumps_the_ring(caplog):
+    async def main():
+        ((reader, writer), (remoteReader, remoteWriter)) = SimulatedNetwork().link()
+        peer = Peer(reader, writer, 42)
+        peer.unknownPolicy = BGBProtocol.DISCONNECT
+        remoteWriter.write(packet(1) + bytes(8))
+        await peer._read_loop()
+    tracer.clear()
+    with caplog.at_level(logging.INFO, logger='PacketTracer'):
+        run(main())
+    assert 'Dumping 2 traced packet events.' in caplog.text